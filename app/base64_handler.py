@@ -13,12 +13,19 @@ import re
 import base64
 import logging
 import hashlib
+import functools
+import time
 from typing import Dict, Optional, Tuple, Union, List, Any
-from datetime import datetime
 from pathlib import Path
 import aiohttp
 import asyncio
 
+# pybase64 использует SIMD-реализацию декодирования; без него работает стандартный base64
+try:
+    import pybase64 as _b64
+except ImportError:
+    _b64 = base64
+
 # Устанавливаем logger для модуля
 logger = logging.getLogger(__name__)
 
@@ -54,6 +61,68 @@ IMAGE_API_TEMPLATES = [
     "https://http2.mlstatic.com/D_NQ_NP_2X_{item_id}-MLU{item_id}-F.webp"
 ]
 
+# Пробельные символы, удаляемые из Base64-данных через bytes.translate
+_WS_CHARS = b' \t\r\n\x0b\x0c'
+# Символы заполнения Base64; добавляется срез нужной длины
+_PAD = b'==='
+
+# Максимальное число одновременных соединений при поиске изображений
+IMAGE_CONNECTIONS_LIMIT = 10
+
+# Размер блока при потоковой записи скачиваемых изображений
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+# Длина заголовка data URL, в пределах которой ищется маркер ';base64,'
+_DATA_URL_HEADER_LIMIT = 64
+
+# Предкомпилированные регулярные выражения
+_MIME_RE = re.compile(r'data:([^;]+)')
+_IMG_B64_RE = re.compile(r'<img[^>]+src="(data:image/[^;]+;base64,[^"]+)"[^>]+width="([^"]+)"')
+_MLU_RE = re.compile(r'MLU-?(\d+)')
+_MLU_PREFIX_RE = re.compile(r'^MLU')
+
+# Шаблоны для поиска ID изображения в HTML (в порядке приоритета)
+_IMAGE_ID_PATTERNS = (
+    r'"picture_id":"(?P<picture_id>[^"]+)"',
+    r'"image_id":"(?P<image_id>[^"]+)"',
+    r'data-zoom="https://http2\.mlstatic\.com/D_NQ_NP_\d*_?(?P<data_zoom>[^"\.]+)',
+    r'https://http2\.mlstatic\.com/D_NQ_NP_\d*_?(?P<webp_url>[^"\.]+)\.webp',
+    r'<img[^>]+src="https://http2\.mlstatic\.com/D_NQ_NP_[^"]*?(?P<img_src>\d+)-[^"]*\.webp"',
+    r'content="https://http2\.mlstatic\.com/D_NQ_NP_[^"]*?(?P<meta_content>\d+)-[^"]*\.webp"'
+)
+
+# Шаблоны для поиска готовых URL изображений в HTML (в порядке приоритета)
+_IMAGE_URL_PATTERNS = (
+    r'(?P<webp>https://http2\.mlstatic\.com/D_NQ_NP_[^"]+\.webp)"',
+    r'(?P<jpg>https://http2\.mlstatic\.com/D_NQ_NP_[^"]+\.jpg)"',
+    r'content="(?P<meta>https://http2\.mlstatic\.com/D_NQ_NP_[^"]+\.(?:webp|jpg))"'
+)
+
+# Каждый набор шаблонов объединен в одно выражение, и HTML просматривается один раз.
+# Альтернация обернута в lookahead, чтобы совпадение одного шаблона не "съедало"
+# текст, в котором начинается совпадение другого (например, URL внутри <img>).
+# Сработавший шаблон определяется по имени группы (match.lastgroup).
+_IMAGE_ID_RE = re.compile("(?=" + "|".join(_IMAGE_ID_PATTERNS) + ")")
+_IMAGE_URL_RE = re.compile("(?=" + "|".join(_IMAGE_URL_PATTERNS) + ")")
+# Имя группы -> приоритет шаблона
+_IMAGE_ID_PRIORITY = {name: i for i, name in enumerate(_IMAGE_ID_RE.groupindex)}
+_IMAGE_URL_PRIORITY = {name: i for i, name in enumerate(_IMAGE_URL_RE.groupindex)}
+
+# Директории, уже созданные в этом процессе
+_CREATED_DIRS = set()
+
+def _ensure_dir(directory: str) -> None:
+    """
+    Создает директорию, если она еще не создавалась в этом процессе.
+    Системный вызов выполняется не более одного раза на директорию.
+    
+    Args:
+        directory: путь к директории
+    """
+    if directory not in _CREATED_DIRS:
+        os.makedirs(directory, exist_ok=True)
+        _CREATED_DIRS.add(directory)
+
 def is_base64_image(data_url: str) -> bool:
     """
     Проверяет, является ли строка корректным Base64-изображением.
@@ -71,8 +140,9 @@ def is_base64_image(data_url: str) -> bool:
     if not data_url.startswith('data:image/'):
         return False
     
-    # Проверка наличия маркера base64
-    if ';base64,' not in data_url:
+    # Проверка наличия маркера base64: он стоит в заголовке, поэтому
+    # многомегабайтные данные после него не просматриваются
+    if ';base64,' not in data_url[:_DATA_URL_HEADER_LIMIT]:
         return False
     
     return True
@@ -94,7 +164,7 @@ def get_image_format_from_data_url(data_url: str) -> Tuple[str, str, str]:
     header, b64_data = data_url.split(';base64,', 1)
     
     # Извлекаем тип изображения
-    mime_match = re.match(r'data:([^;]+)', header)
+    mime_match = _MIME_RE.match(header)
     if not mime_match:
         # Если не найден тип, используем значение по умолчанию
         mime_type = "image/jpeg"
@@ -118,20 +188,40 @@ def decode_base64_image(b64_data: str) -> Optional[bytes]:
     """
     try:
         # Удаляем все пробелы и переносы строк для улучшения совместимости
-        cleaned_data = re.sub(r'\s+', '', b64_data)
+        cleaned_data = b64_data.encode('ascii').translate(None, _WS_CHARS)
         
-        # Добавляем отсутствующие символы заполнения, если необходимо
-        padding = 4 - (len(cleaned_data) % 4)
-        if padding < 4:
-            cleaned_data += "=" * padding
+        # Добавляем отсутствующие символы заполнения (от 0 до 3)
+        cleaned_data += _PAD[:-len(cleaned_data) & 3]
         
         # Декодируем с обработкой ошибок
-        img_data = base64.b64decode(cleaned_data)
+        img_data = _b64.b64decode(cleaned_data, validate=False)
         return img_data
     except Exception as e:
         logger.error(f"Ошибка при декодировании Base64-данных: {e}")
         return None
 
+@functools.lru_cache(maxsize=1024)
+def _url_hash(url: str) -> str:
+    """
+    Возвращает короткий хеш URL для имен файлов изображений.
+    Кэшируется, так как для одной страницы хеш вычисляется для каждого изображения.
+    """
+    return hashlib.md5(url.encode()).hexdigest()[:10]
+
+@functools.lru_cache(maxsize=1)
+def _timestamp(second: int) -> str:
+    """
+    Форматирует метку времени для имени файла. Кэш хранит последнее значение,
+    поэтому strftime выполняется не чаще раза в секунду.
+    
+    Args:
+        second: время в секундах с начала эпохи
+        
+    Returns:
+        str: Метка времени в формате YYYYMMDD_HHMMSS
+    """
+    return time.strftime("%Y%m%d_%H%M%S", time.localtime(second))
+
 def generate_image_filename(url: str, extension: str, img_id: Optional[str] = None) -> str:
     """
     Генерирует имя файла для изображения на основе URL и ID.
@@ -149,8 +239,8 @@ def generate_image_filename(url: str, extension: str, img_id: Optional[str] = No
         return f"{img_id}.{extension}"
     
     # Создаем хеш от URL для уникального имени файла
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:10]
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    url_hash = _url_hash(url)
+    timestamp = _timestamp(int(time.time()))
     
     return f"{url_hash}_{timestamp}.{extension}"
 
@@ -187,7 +277,7 @@ def save_base64_image(data_url: str, url: str, img_id: Optional[str] = None, dir
             return None
         
         # Создаем директорию, если она не существует
-        os.makedirs(directory, exist_ok=True)
+        _ensure_dir(directory)
         
         # Генерируем имя файла
         filename = generate_image_filename(url, extension, img_id)
@@ -241,8 +331,7 @@ def extract_base64_images_from_html(html: str, url: str, min_width: int = 200) -
     saved_images = {}
     
     # Поиск всех Base64-изображений с атрибутом width
-    pattern = r'<img[^>]+src="(data:image/[^;]+;base64,[^"]+)"[^>]+width="([^"]+)"'
-    matches = re.findall(pattern, html)
+    matches = _IMG_B64_RE.findall(html)
     
     if not matches:
         logger.info(f"В HTML не найдено Base64-изображений")
@@ -263,7 +352,7 @@ def extract_base64_images_from_html(html: str, url: str, min_width: int = 200) -
                 continue
                 
             # Сохраняем изображение
-            img_id = f"{hashlib.md5(url.encode()).hexdigest()[:6]}_{i+1}"
+            img_id = f"{_url_hash(url)[:6]}_{i+1}"
             file_path = process_and_save_base64_image(base64_img, url, img_id)
             
             if file_path:
@@ -284,9 +373,20 @@ async def generate_image_variants(item_id: str) -> List[str]:
     Returns:
         List[str]: Список всех возможных URL изображений
     """
+    return list(_generate_image_variants_sync(item_id))
+
+@functools.lru_cache(maxsize=4096)
+def _generate_image_variants_sync(item_id: str) -> Tuple[str, ...]:
+    """
+    Строит варианты URL изображений для ID. Результат кэшируется: список
+    зависит только от ID, а одни и те же объявления встречаются повторно.
+    
+    Returns:
+        Tuple[str, ...]: Варианты URL без дубликатов в порядке шаблонов
+    """
     # Нормализуем ID (удаляем дефис, если есть)
     normalized_id = item_id.replace("-", "")
-    pure_id = re.sub(r'^MLU', '', normalized_id)
+    pure_id = _MLU_PREFIX_RE.sub('', normalized_id)
     
     variants = []
     
@@ -307,55 +407,290 @@ async def generate_image_variants(item_id: str) -> List[str]:
         variants.append(f"https://http2.mlstatic.com/D_NQ_NP_2X_{pattern}{pure_id}-F.webp")
         variants.append(f"https://http2.mlstatic.com/D_NQ_NP_{pattern}{pure_id}-F.webp")
     
-    return list(set(variants))  # Убираем дубликаты
+    # Убираем дубликаты, сохраняя порядок шаблонов: более вероятные варианты
+    # проверяются первыми
+    return tuple(dict.fromkeys(variants))
 
-async def check_image_url(url: str) -> bool:
+async def check_image_url(url: str, session: Optional[aiohttp.ClientSession] = None) -> bool:
     """
     Проверяет доступность изображения по URL.
     
     Args:
         url: URL изображения для проверки
+        session: сессия aiohttp; если не указана, создается на время вызова
         
     Returns:
         bool: Доступно ли изображение
     """
+    if session is None:
+        async with aiohttp.ClientSession() as own_session:
+            return await check_image_url(url, own_session)
+    
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.head(url, allow_redirects=True, timeout=10) as response:
-                if response.status == 200:
-                    content_type = response.headers.get('Content-Type', '')
-                    if 'image/' in content_type:
-                        return True
+        async with session.head(url, allow_redirects=True, timeout=10) as response:
+            if response.status == 200:
+                content_type = response.headers.get('Content-Type', '')
+                if 'image/' in content_type:
+                    return True
     except Exception as e:
         logger.debug(f"Ошибка при проверке URL {url}: {e}")
     
     return False
 
-async def save_image_from_url(url: str, save_path: str) -> bool:
+async def save_image_from_url(url: str, save_path: str, session: Optional[aiohttp.ClientSession] = None) -> bool:
     """
     Скачивает и сохраняет изображение.
     
     Args:
         url: URL изображения
         save_path: Путь для сохранения
+        session: сессия aiohttp; если не указана, создается на время вызова
         
     Returns:
         bool: Успешно ли сохранено изображение
     """
+    if session is None:
+        async with aiohttp.ClientSession() as own_session:
+            return await save_image_from_url(url, save_path, own_session)
+    
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=30) as response:
-                if response.status == 200:
-                    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                    with open(save_path, 'wb') as f:
-                        f.write(await response.read())
-                    logger.info(f"Изображение сохранено: {save_path}")
-                    return True
+        part_path = f"{save_path}.part"
+        if await _download_image(session, url, part_path, require_image=False):
+            os.replace(part_path, save_path)
+            logger.info(f"Изображение сохранено: {save_path}")
+            return True
     except Exception as e:
         logger.error(f"Ошибка при сохранении изображения {url}: {e}")
     
     return False
 
+def _discard_opened_file(path: str, opening: "asyncio.Future") -> None:
+    """
+    Закрывает и удаляет файл, открытие которого завершилось после отмены загрузки.
+    
+    Args:
+        path: путь к файлу
+        opening: завершенная задача открытия файла
+    """
+    if not opening.cancelled() and opening.exception() is None:
+        opening.result().close()
+    if os.path.exists(path):
+        os.remove(path)
+
+async def _download_image(session: aiohttp.ClientSession, url: str, path: str, require_image: bool = True) -> bool:
+    """
+    Скачивает изображение GET-запросом, записывая ответ в файл частями.
+    При ошибке или отмене недокачанный файл удаляется.
+    
+    Args:
+        session: сессия aiohttp
+        url: URL изображения
+        path: путь к файлу для записи
+        require_image: требовать Content-Type изображения
+        
+    Returns:
+        bool: Успешно ли скачано изображение
+    """
+    async with session.get(url, allow_redirects=True, timeout=30) as response:
+        if response.status != 200:
+            return False
+        if require_image and 'image/' not in response.headers.get('Content-Type', ''):
+            return False
+        
+        _ensure_dir(os.path.dirname(path) or '.')
+        # Открытие и запись файла выполняются в потоке, чтобы не блокировать event loop.
+        # Отмена не останавливает поток, и файл все равно будет создан, поэтому
+        # открытие защищено shield, а при отмене файл удаляется после его завершения
+        opening = asyncio.ensure_future(asyncio.to_thread(open, path, 'wb'))
+        try:
+            f = await asyncio.shield(opening)
+        except BaseException:
+            opening.add_done_callback(functools.partial(_discard_opened_file, path))
+            raise
+        try:
+            try:
+                async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+        except BaseException:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+    return True
+
+async def _save_first_available_image(session: aiohttp.ClientSession, img_urls: List[str],
+                                      item_id: str, img_dir: str) -> Optional[str]:
+    """
+    Параллельно скачивает изображения по URL и сохраняет первое доступное.
+    Отдельная проверка HEAD-запросом не выполняется: изображения небольшие,
+    и GET сразу дает и проверку, и данные. Каждый кандидат пишется во временный
+    файл, оставшиеся загрузки отменяются, как только изображение сохранено.
+    
+    Args:
+        session: сессия aiohttp для всех запросов
+        img_urls: URL изображений для проверки
+        item_id: ID товара для имени файла
+        img_dir: директория для сохранения изображений
+        
+    Returns:
+        Optional[str]: Путь к сохраненному изображению или None
+    """
+    # Ограничиваем число одновременных загрузок, чтобы ожидание свободного
+    # соединения не входило в таймаут запроса
+    semaphore = asyncio.Semaphore(IMAGE_CONNECTIONS_LIMIT)
+    
+    async def probe(index: int, img_url: str) -> Optional[Tuple[str, str]]:
+        part_path = f"{img_dir}/{item_id}.{index}.part"
+        async with semaphore:
+            try:
+                if await _download_image(session, img_url, part_path):
+                    return img_url, part_path
+            except Exception as e:
+                logger.debug(f"Ошибка при проверке URL {img_url}: {e}")
+        return None
+    
+    tasks = [asyncio.ensure_future(probe(i, img_url)) for i, img_url in enumerate(img_urls)]
+    result = None
+    try:
+        for completed in asyncio.as_completed(tasks):
+            found = await completed
+            if not found:
+                continue
+            img_url, part_path = found
+            logger.info(f"Найдено изображение для {item_id}: {img_url}")
+            # Сохраняем изображение
+            ext = img_url.split('.')[-1]
+            save_path = f"{img_dir}/{item_id}.{ext}"
+            os.replace(part_path, save_path)
+            logger.info(f"Изображение сохранено: {save_path}")
+            result = save_path
+            break
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Удаляем временные файлы загрузок, завершившихся одновременно с выбранной
+        for found in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(found, tuple) and os.path.exists(found[1]):
+                os.remove(found[1])
+    
+    return result
+
+def _find_image_id(html: str) -> Optional[str]:
+    """
+    Ищет ID изображения в HTML за один проход.
+    Результат совпадает с последовательной проверкой шаблонов: берется первое
+    совпадение самого приоритетного из сработавших шаблонов.
+    
+    Args:
+        html: HTML-код страницы
+        
+    Returns:
+        Optional[str]: ID изображения или None
+    """
+    best_priority = len(_IMAGE_ID_PRIORITY)
+    image_id = None
+    for match in _IMAGE_ID_RE.finditer(html):
+        priority = _IMAGE_ID_PRIORITY[match.lastgroup]
+        if priority < best_priority:
+            best_priority = priority
+            image_id = match.group(match.lastgroup)
+            if priority == 0:
+                break
+    return image_id
+
+def _find_image_urls(html: str) -> List[str]:
+    """
+    Ищет готовые URL изображений в HTML за один проход.
+    URL возвращаются сгруппированными по приоритету шаблонов, внутри группы —
+    в порядке появления на странице.
+    
+    Args:
+        html: HTML-код страницы
+        
+    Returns:
+        List[str]: Найденные URL изображений
+    """
+    buckets: List[List[str]] = [[] for _ in _IMAGE_URL_PRIORITY]
+    # Конец последнего совпадения каждого шаблона: совпадения одного шаблона
+    # не должны перекрываться, как и при findall
+    last_end = [-1] * len(_IMAGE_URL_PRIORITY)
+    for match in _IMAGE_URL_RE.finditer(html):
+        priority = _IMAGE_URL_PRIORITY[match.lastgroup]
+        if match.start() < last_end[priority]:
+            continue
+        last_end[priority] = match.end(match.lastgroup)
+        buckets[priority].append(match.group(match.lastgroup))
+    return [img_url for bucket in buckets for img_url in bucket]
+
+async def _find_image_for_listing(session: aiohttp.ClientSession, url: str, item_id: str, img_dir: str) -> Optional[str]:
+    """
+    Ищет и сохраняет изображение объявления, используя общую сессию aiohttp.
+    
+    Args:
+        session: сессия aiohttp для всех запросов
+        url: URL страницы товара
+        item_id: ID товара
+        img_dir: директория для сохранения изображений
+        
+    Returns:
+        Optional[str]: Путь к сохраненному изображению или None
+    """
+    # 1. Пробуем прямые URL по шаблонам
+    variants = await generate_image_variants(item_id)
+    logger.info(f"Сгенерировано {len(variants)} вариантов URL для {item_id}")
+    
+    save_path = await _save_first_available_image(session, variants, item_id, img_dir)
+    if save_path:
+        return save_path
+    
+    # 2. Если не нашли по шаблонам, пробуем извлечь из HTML
+    logger.info(f"Не удалось найти изображение по шаблонам для {item_id}. Пытаемся извлечь из HTML...")
+    
+    try:
+        async with session.get(url, timeout=30) as response:
+            if response.status == 200:
+                html = await response.text()
+                
+                # Ищем ID изображения в HTML
+                image_id = _find_image_id(html)
+                
+                if image_id:
+                    logger.info(f"Извлечен ID изображения из страницы: {image_id}")
+                    # Формируем URL на основе найденного ID
+                    img_urls = [
+                        f"https://http2.mlstatic.com/D_NQ_NP_2X_{image_id}.webp",
+                        f"https://http2.mlstatic.com/D_NQ_NP_{image_id}.webp"
+                    ]
+                    
+                    # Проверяем URL
+                    save_path = await _save_first_available_image(session, img_urls, item_id, img_dir)
+                    if save_path:
+                        return save_path
+                
+                # 3. Если не нашли ID, ищем готовые URL в HTML
+                found_urls = []
+                for img_url in _find_image_urls(html):
+                    if img_url.startswith('http') and 'http2.mlstatic.com' in img_url:
+                        # Проверяем, что это не заглушка
+                        if not any(x in img_url for x in ['mercadolibre.com/homes', 'placeholder', 'org-img']):
+                            found_urls.append(img_url)
+                
+                if found_urls:
+                    # Проверяем доступность и сохраняем изображение
+                    save_path = await _save_first_available_image(session, found_urls, item_id, img_dir)
+                    if save_path:
+                        return save_path
+                
+                # 4. Ищем Base64 изображения
+                base64_images = extract_base64_images_from_html(html, url, min_width=300)
+                if base64_images:
+                    return list(base64_images.values())[0]  # Возвращаем первое найденное
+    except Exception as e:
+        logger.error(f"Ошибка при извлечении изображения из HTML: {e}")
+    
+    return None
+
 async def get_image_for_listing(url: str, item_id: str = None) -> Optional[str]:
     """
     Получает изображение для указанного URL листинга.
@@ -370,7 +705,7 @@ async def get_image_for_listing(url: str, item_id: str = None) -> Optional[str]:
     """
     # Если ID не указан, извлекаем из URL
     if not item_id:
-        id_match = re.search(r'MLU-?(\d+)', url)
+        id_match = _MLU_RE.search(url)
         if id_match:
             item_id = id_match.group(0)
         else:
@@ -381,97 +716,15 @@ async def get_image_for_listing(url: str, item_id: str = None) -> Optional[str]:
     
     # Создаем директорию для изображений
     img_dir = 'images'
-    os.makedirs(img_dir, exist_ok=True)
-    
-    # 1. Пробуем прямые URL по шаблонам
-    variants = await generate_image_variants(item_id)
-    logger.info(f"Сгенерировано {len(variants)} вариантов URL для {item_id}")
-    
-    for i, img_url in enumerate(variants):
-        if i % 10 == 0:
-            logger.debug(f"Проверка вариантов {i+1}-{min(i+10, len(variants))} из {len(variants)}")
-        
-        is_available = await check_image_url(img_url)
-        if is_available:
-            logger.info(f"Найдено изображение для {item_id}: {img_url}")
-            # Сохраняем изображение
-            ext = img_url.split('.')[-1]
-            save_path = f"{img_dir}/{item_id}.{ext}"
-            if await save_image_from_url(img_url, save_path):
-                return save_path
-    
-    # 2. Если не нашли по шаблонам, пробуем извлечь из HTML
-    logger.info(f"Не удалось найти изображение по шаблонам для {item_id}. Пытаемся извлечь из HTML...")
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=30) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    
-                    # Ищем ID изображения в HTML
-                    patterns = [
-                        r'"picture_id":"([^"]+)"',
-                        r'"image_id":"([^"]+)"',
-                        r'data-zoom="https://http2\.mlstatic\.com/D_NQ_NP_\d*_?([^"\.]+)',
-                        r'https://http2\.mlstatic\.com/D_NQ_NP_\d*_?([^"\.]+)\.webp',
-                        r'<img[^>]+src="https://http2\.mlstatic\.com/D_NQ_NP_[^"]*?(\d+)-[^"]*\.webp"',
-                        r'content="https://http2\.mlstatic\.com/D_NQ_NP_[^"]*?(\d+)-[^"]*\.webp"'
-                    ]
-                    
-                    image_id = None
-                    for pattern in patterns:
-                        matches = re.findall(pattern, html)
-                        if matches:
-                            image_id = matches[0]
-                            logger.info(f"Извлечен ID изображения из страницы: {image_id}")
-                            break
-                    
-                    if image_id:
-                        # Формируем URL на основе найденного ID
-                        img_urls = [
-                            f"https://http2.mlstatic.com/D_NQ_NP_2X_{image_id}.webp",
-                            f"https://http2.mlstatic.com/D_NQ_NP_{image_id}.webp"
-                        ]
-                        
-                        # Проверяем каждый URL
-                        for img_url in img_urls:
-                            if await check_image_url(img_url):
-                                # Сохраняем изображение
-                                ext = img_url.split('.')[-1]
-                                save_path = f"{img_dir}/{item_id}.{ext}"
-                                if await save_image_from_url(img_url, save_path):
-                                    return save_path
-                    
-                    # 3. Если не нашли ID, ищем готовые URL в HTML
-                    img_url_patterns = [
-                        r'(https://http2\.mlstatic\.com/D_NQ_NP_[^"]+\.webp)"',
-                        r'(https://http2\.mlstatic\.com/D_NQ_NP_[^"]+\.jpg)"',
-                        r'content="(https://http2\.mlstatic\.com/D_NQ_NP_[^"]+\.(webp|jpg))"'
-                    ]
-                    
-                    for pattern in img_url_patterns:
-                        img_matches = re.findall(pattern, html)
-                        if img_matches:
-                            for img_match in img_matches:
-                                img_url = img_match[0] if isinstance(img_match, tuple) else img_match
-                                if img_url.startswith('http') and 'http2.mlstatic.com' in img_url:
-                                    # Проверяем, что это не заглушка
-                                    if not any(x in img_url for x in ['mercadolibre.com/homes', 'placeholder', 'org-img']):
-                                        # Проверяем доступность
-                                        if await check_image_url(img_url):
-                                            # Сохраняем изображение
-                                            ext = img_url.split('.')[-1]
-                                            save_path = f"{img_dir}/{item_id}.{ext}"
-                                            if await save_image_from_url(img_url, save_path):
-                                                return save_path
-                    
-                    # 4. Ищем Base64 изображения
-                    base64_images = extract_base64_images_from_html(html, url, min_width=300)
-                    if base64_images:
-                        return list(base64_images.values())[0]  # Возвращаем первое найденное
-    except Exception as e:
-        logger.error(f"Ошибка при извлечении изображения из HTML: {e}")
+    _ensure_dir(img_dir)
+    
+    # Все запросы выполняются через одну сессию, чтобы переиспользовать
+    # соединения с http2.mlstatic.com вместо нового подключения на каждую проверку
+    connector = aiohttp.TCPConnector(limit=IMAGE_CONNECTIONS_LIMIT, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        result = await _find_image_for_listing(session, url, item_id, img_dir)
+        if result:
+            return result
     
     logger.warning(f"Не удалось найти изображение для {item_id}")
     return None
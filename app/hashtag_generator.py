@@ -3,9 +3,11 @@
 Модуль для генерации хэштегов на основе данных объявления.
 """
 
+import bisect
+import functools
 import logging
 import re
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Set, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -66,6 +68,54 @@ REGION_HASHTAGS = {
     'treinta y tres': '#TreintaYTres'
 }
 
+# Границы диапазонов площади (в гектарах) -> Хэштег диапазона
+AREA_BUCKET_EDGES = (1, 5, 10, 50, 100)
+AREA_BUCKET_HASHTAGS = (
+    '#MenosDe1Ha',
+    '#De1a5Ha',
+    '#De5a10Ha',
+    '#De10a50Ha',
+    '#De50a100Ha',
+    '#MasDe100Ha'
+)
+
+# Общие хэштеги, добавляемые к каждому объявлению
+GENERAL_HASHTAGS = frozenset({'#Uruguay', '#TerrenosUY', '#InmueblesUY'})
+
+# --- Предкомпилированные шаблоны ---
+
+# Все шаблоны FEATURE_KEYWORDS объединены в одно выражение: по группе на хэштег.
+# Альтернация обернута в lookahead, чтобы совпадения не "съедали" текст друг у друга
+# (например, 'frutal' и 'ruta' внутри него) — за один проход находятся все хэштеги.
+_FEATURE_RE = re.compile(
+    "(?=" + "|".join(f"({pattern})" for pattern in FEATURE_KEYWORDS) + ")",
+    re.IGNORECASE
+)
+_FEATURE_HASHTAGS = tuple(FEATURE_KEYWORDS.values())
+
+# Все регионы ищутся одним проходом по локации. При нескольких совпадениях
+# выбирается регион, стоящий раньше в REGION_HASHTAGS, как и при переборе словаря.
+# Ключи упорядочены от длинных к коротким, чтобы в одной позиции побеждало
+# самое длинное название региона.
+_REGION_KEYS = tuple(sorted(REGION_HASHTAGS, key=len, reverse=True))
+_REGION_RE = re.compile("(?=(" + "|".join(map(re.escape, _REGION_KEYS)) + "))")
+# Ключ региона -> (приоритет, хэштег)
+_REGION_LOOKUP = {
+    keyword: (priority, hashtag)
+    for priority, (keyword, hashtag) in enumerate(REGION_HASHTAGS.items())
+}
+
+_DEPARTAMENTO_RE = re.compile(r'departamento\s+de')
+_NON_ALNUM_RE = re.compile(r'[^a-zA-Z0-9]')
+_AREA_HA_RE = re.compile(r'(\d+[.,]?\d*)\s*(ha|hect[áa]reas?)', re.IGNORECASE)
+_AREA_M2_RE = re.compile(r'(\d+[.,]?\d*)\s*(m²|m2|metros|mts)', re.IGNORECASE)
+
+# Источник -> Хэштег для источников, которые обходят парсеры
+_SOURCE_HASHTAGS: Dict[str, str] = {
+    source: f"#{source.capitalize()}"
+    for source in ('mercadolibre', 'infocasas', 'gallito')
+}
+
 # --- Основная функция --- 
 
 def generate_hashtags(listing: Dict[str, Any]) -> List[str]:
@@ -79,57 +129,103 @@ def generate_hashtags(listing: Dict[str, Any]) -> List[str]:
     Returns:
         Список хэштегов.
     """
+    title = listing.get('title', '')
+    hashtags = list(_generate_hashtags_cached(
+        listing.get("source"),
+        title,
+        listing.get('location', ''),
+        listing.get('description', title), # Используем title, если нет описания
+        listing.get('area', '')
+    ))
+    
+    logger.debug(f"Сгенерированные хэштеги для ID {listing.get('id', 'N/A')}: {hashtags}")
+    return hashtags # Возвращаем отсортированный список
+
+def generate_hashtags_batch(listings: List[Dict[str, Any]]) -> List[List[str]]:
+    """
+    Генерирует хэштеги для пакета объявлений за один вызов.
+    Повторяющиеся объявления берутся из кэша, отладочный лог пишется один раз на пакет.
+    
+    Args:
+        listings: Список словарей с данными объявлений.
+        
+    Returns:
+        Список списков хэштегов в порядке входных объявлений.
+    """
+    results = []
+    for listing in listings:
+        title = listing.get('title', '')
+        results.append(list(_generate_hashtags_cached(
+            listing.get("source"),
+            title,
+            listing.get('location', ''),
+            listing.get('description', title),
+            listing.get('area', '')
+        )))
+    
+    logger.debug(f"Сгенерированы хэштеги для {len(results)} объявлений")
+    return results
+
+@functools.lru_cache(maxsize=100_000)
+def _generate_hashtags_cached(
+    source: Optional[str],
+    title: str,
+    location: str,
+    description: str,
+    area: str
+) -> Tuple[str, ...]:
+    """
+    Вычисляет хэштеги по полям объявления. Результат кэшируется, так как
+    одни и те же объявления встречаются при повторных запусках парсеров.
+    
+    Returns:
+        Отсортированный кортеж хэштегов.
+    """
     hashtags: Set[str] = set()
     
     # 1. Добавляем источник
-    source = listing.get("source")
     if source:
-        hashtags.add(f"#{source.capitalize()}")
+        hashtags.add(_SOURCE_HASHTAGS.get(source) or f"#{source.capitalize()}")
         
-    # 2. Собираем текст для анализа
-    title = listing.get('title', '')
-    location = listing.get('location', '')
-    description = listing.get('description', title) # Используем title, если нет описания
-    area = listing.get('area', '')
-    # Объединяем все текстовые поля для поиска ключевых слов
-    full_text = f"{title} {location} {description} {area}".lower()
+    # 2. Объединяем все текстовые поля для поиска ключевых слов
+    # Локация приводится к нижнему регистру один раз и переиспользуется в п. 4
+    location_lower = location.lower()
+    full_text = f"{str(title).lower()} {location_lower} {str(description).lower()} {str(area).lower()}"
     
     # 3. Генерируем хэштеги по ключевым словам
-    for pattern, hashtag in FEATURE_KEYWORDS.items():
-        if re.search(pattern, full_text, re.IGNORECASE):
-            hashtags.add(hashtag)
+    for match in _FEATURE_RE.finditer(full_text):
+        hashtags.add(_FEATURE_HASHTAGS[match.lastindex - 1])
 
     # 4. Генерируем хэштеги по локации
-    location_lower = location.lower()
-    region_found = False
-    for region_keyword, region_hashtag in REGION_HASHTAGS.items():
-        if region_keyword in location_lower:
-            hashtags.add(region_hashtag)
-            region_found = True
-            # Можно добавить логику для извлечения города/населенного пункта, если нужно
-            # Например, извлечь часть строки до названия региона
-            try:
-                city_part = location_lower.split(region_keyword)[0].strip(' ,-')
-                # Убираем общие слова типа "departamento"
-                city_part = re.sub(r'departamento\s+de', '', city_part).strip()
-                if city_part and len(city_part) > 2: # Простая проверка, что это не просто остатки
-                    # Преобразуем в хэштег (убираем пробелы, спецсимволы, делаем CamelCase)
-                    city_hashtag = '#' + re.sub(r'[^a-zA-Z0-9]', '', city_part.title().replace(' ', ''))
-                    # Добавляем, только если хэштег не слишком короткий и не совпадает с регионом
-                    if len(city_hashtag) > 3 and city_hashtag.lower() != region_hashtag.lower():
-                       hashtags.add(city_hashtag)
-            except Exception as loc_err:
-                logger.debug(f"Ошибка при извлечении города из '{location}': {loc_err}")
-            break # Нашли регион, дальше не ищем (для предотвращения дублей типа #Rocha #LaPalomaRocha)
-            
-    # Если регион не найден, добавляем общий тэг
-    if not region_found:
+    region_hits: Dict[str, int] = {}
+    for match in _REGION_RE.finditer(location_lower):
+        region_hits.setdefault(match.group(1), match.start())
+
+    if region_hits:
+        region_keyword = min(region_hits, key=_REGION_LOOKUP.__getitem__)
+        region_hashtag = _REGION_LOOKUP[region_keyword][1]
+        hashtags.add(region_hashtag)
+        # Извлекаем город/населенный пункт: часть строки до первого упоминания региона
+        try:
+            city_part = location_lower[:region_hits[region_keyword]].strip(' ,-')
+            # Убираем общие слова типа "departamento"
+            city_part = _DEPARTAMENTO_RE.sub('', city_part).strip()
+            if city_part and len(city_part) > 2: # Простая проверка, что это не просто остатки
+                # Преобразуем в хэштег (убираем пробелы, спецсимволы, делаем CamelCase)
+                city_hashtag = '#' + _NON_ALNUM_RE.sub('', city_part.title().replace(' ', ''))
+                # Добавляем, только если хэштег не слишком короткий и не совпадает с регионом
+                if len(city_hashtag) > 3 and city_hashtag.lower() != region_hashtag.lower():
+                   hashtags.add(city_hashtag)
+        except Exception as loc_err:
+            logger.debug(f"Ошибка при извлечении города из '{location}': {loc_err}")
+    else:
+        # Если регион не найден, добавляем общий тэг
         hashtags.add("#UbicacionDesconocida")
         
     # 5. Добавляем хэштег по размеру участка (если указан)
     if area and area != 'N/A':
-        area_match_ha = re.search(r'(\d+[.,]?\d*)\s*(ha|hect[áa]reas?)', area, re.IGNORECASE)
-        area_match_m2 = re.search(r'(\d+[.,]?\d*)\s*(m²|m2|metros|mts)', area, re.IGNORECASE)
+        area_match_ha = _AREA_HA_RE.search(area)
+        area_match_m2 = _AREA_M2_RE.search(area)
         size_ha = 0
         if area_match_ha:
             try:
@@ -144,26 +240,12 @@ def generate_hashtags(listing: Dict[str, Any]) -> List[str]:
                  pass
         
         if size_ha > 0:
-            if size_ha < 1:
-                hashtags.add("#MenosDe1Ha")
-            elif size_ha < 5:
-                hashtags.add("#De1a5Ha")
-            elif size_ha < 10:
-                hashtags.add("#De5a10Ha")
-            elif size_ha < 50:
-                 hashtags.add("#De10a50Ha")
-            elif size_ha < 100:
-                 hashtags.add("#De50a100Ha")
-            else:
-                 hashtags.add("#MasDe100Ha")
+            hashtags.add(AREA_BUCKET_HASHTAGS[bisect.bisect_right(AREA_BUCKET_EDGES, size_ha)])
 
     # 6. Добавляем общие хэштеги
-    hashtags.add("#Uruguay")
-    hashtags.add("#TerrenosUY")
-    hashtags.add("#InmueblesUY")
+    hashtags.update(GENERAL_HASHTAGS)
     
-    logger.debug(f"Сгенерированные хэштеги для ID {listing.get('id', 'N/A')}: {sorted(list(hashtags))}")
-    return sorted(list(hashtags)) # Возвращаем отсортированный список
+    return tuple(sorted(hashtags))
 
 # --- Тестовая функция --- 
 if __name__ == "__main__":
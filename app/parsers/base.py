@@ -9,14 +9,14 @@ import random
 import os
 import time
 import traceback
-import json
 from abc import ABC, abstractmethod
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Optional, Dict, Any, Set, Tuple, Callable
 
-from playwright.async_api import async_playwright, Browser, Page, BrowserContext, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+from playwright.async_api import async_playwright, Playwright, Browser, Page, BrowserContext, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
 from playwright_stealth import stealth_async
+import orjson
 
 # Импортируем модель данных
 from app.models import Listing
@@ -25,6 +25,29 @@ class RetryException(Exception):
     """Исключение, указывающее на необходимость повторной попытки."""
     pass
 
+# Параметры сериализации отладочных JSON-файлов парсеров
+_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+
+# Драйвер Playwright, общий для всех парсеров процесса
+_playwright_task: Optional[asyncio.Task] = None
+
+async def get_playwright() -> Playwright:
+    """
+    Возвращает общий драйвер Playwright, запуская его при первом обращении.
+    Драйвер привязан к event loop, поэтому для нового loop запускается заново.
+    Параллельные вызовы ожидают один и тот же запуск.
+    
+    Returns:
+        Playwright: Запущенный драйвер Playwright
+    """
+    global _playwright_task
+    loop = asyncio.get_running_loop()
+    task = _playwright_task
+    if (task is None or task.get_loop() is not loop
+            or (task.done() and (task.cancelled() or task.exception() is not None))):
+        task = _playwright_task = loop.create_task(async_playwright().start())
+    return await asyncio.shield(task)
+
 class BaseParser(ABC):
     """
     Абстрактный базовый класс для всех парсеров.
@@ -91,8 +114,8 @@ class BaseParser(ABC):
         try:
             self.logger.info(f"Инициализация браузера (headless={self.headless_mode})")
             
-            # Запускаем Playwright
-            playwright = await async_playwright().start()
+            # Используем общий драйвер Playwright
+            playwright = await get_playwright()
             
             # Запуск браузера
             self.browser = await playwright.chromium.launch(
@@ -272,8 +295,7 @@ class BaseParser(ABC):
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 error_log_path = error_log_dir / f"error_log_{self.SOURCE_NAME}_{timestamp}.json"
                 
-                with open(error_log_path, "w", encoding="utf-8") as f:
-                    json.dump(self.error_log, f, ensure_ascii=False, indent=2)
+                await self._write_json(error_log_path, self.error_log)
                     
                 self.logger.info(f"Сохранен лог ошибок: {error_log_path}")
             except Exception as e:
@@ -373,7 +395,7 @@ class BaseParser(ABC):
                     
                     # Сохраняем текущие результаты даже в случае ошибки
                     if all_listings:
-                        self._save_intermediate_results(all_listings, page_number)
+                        await self._save_intermediate_results(all_listings, page_number)
             
             # Удаляем дубликаты
             unique_listings = self._remove_duplicates(all_listings)
@@ -396,7 +418,7 @@ class BaseParser(ABC):
             
             # Сохраняем то, что уже получили
             if all_listings:
-                self._save_intermediate_results(all_listings, "error")
+                await self._save_intermediate_results(all_listings, "error")
                 
             return all_listings
             
@@ -404,7 +426,32 @@ class BaseParser(ABC):
             # Освобождаем ресурсы
             await self.close()
 
-    def _save_intermediate_results(self, listings: List[Listing], marker: Any) -> None:
+    async def _write_file(self, path: Any, data: Any) -> None:
+        """
+        Записывает текст или байты в файл вне event loop.
+        
+        Args:
+            path: Путь к файлу
+            data: Содержимое файла (str или bytes)
+        """
+        path = Path(path)
+        if isinstance(data, bytes):
+            await asyncio.to_thread(path.write_bytes, data)
+        else:
+            await asyncio.to_thread(path.write_text, data, encoding="utf-8")
+
+    async def _write_json(self, path: Any, data: Any) -> None:
+        """
+        Сериализует данные в JSON через orjson и записывает в файл вне event loop.
+        Несериализуемые значения (даты, URL) приводятся к строке.
+        
+        Args:
+            path: Путь к файлу
+            data: Данные для сохранения
+        """
+        await self._write_file(path, orjson.dumps(data, option=_JSON_OPTIONS, default=str))
+
+    async def _save_intermediate_results(self, listings: List[Listing], marker: Any) -> None:
         """
         Сохраняет промежуточные результаты при возникновении ошибок.
         
@@ -421,8 +468,7 @@ class BaseParser(ABC):
             
             data = [listing.model_dump() for listing in listings]
             
-            with open(results_dir / filename, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            await self._write_json(results_dir / filename, data)
                 
             self.logger.info(f"Сохранены промежуточные результаты: {filename} ({len(listings)} объявлений)")
         except Exception as e:
@@ -188,8 +188,9 @@ class GallitoParser(BaseParser):
                 self.logger.warning(f"Не удалось обойти Cloudflare для {url}")
                 return False
                 
-            # Дополнительно ждем загрузки контента
-            await page.wait_for_load_state('networkidle', timeout=15000)
+            # Дополнительно ждем появления карточек объявлений вместо networkidle,
+            # который на сайте с трекерами может не наступить за время таймаута
+            await page.wait_for_selector(self.list_selectors["item"], timeout=15000)
             
             # Делаем скриншот для отладки
             screenshot_path = f"gallito_success_{random.randint(1000, 9999)}.png"
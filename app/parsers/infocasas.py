@@ -17,6 +17,12 @@ from pydantic import HttpUrl
 from .base import BaseParser # Относительный импорт
 from app.models import Listing # Абсолютный импорт
 
+# Скрипты прокрутки получают параметры аргументами, а не через подстановку в текст,
+# поэтому исходник не меняется между вызовами и компилируется браузером один раз
+_PAGE_METRICS_JS = "() => ({viewport: window.innerHeight, height: document.body.scrollHeight})"
+_SCROLL_TO_JS = "(top) => window.scrollTo(0, top)"
+_SCROLL_TO_BOTTOM_JS = "(offset) => window.scrollTo(0, document.body.scrollHeight - offset)"
+
 class InfoCasasParser(BaseParser):
     """
     Парсер для InfoCasas.com.uy
@@ -103,17 +109,18 @@ class InfoCasasParser(BaseParser):
         self.logger.debug(f"Начинаю прокрутку страницы ({scrolls} раз с задержкой {delay} сек)...")
         
         try:
-            # Получаем высоту страницы
-            page_height = await page.evaluate('document.body.scrollHeight')
+            # Получаем высоту страницы и окна одним вызовом
+            metrics = await page.evaluate(_PAGE_METRICS_JS)
+            page_height = metrics['height']
             
             # Прокручиваем с более плавным шагом
-            viewport_height = await page.evaluate('window.innerHeight')
+            viewport_height = metrics['viewport']
             scroll_step = viewport_height // 2  # Половина высоты окна
             
             for i in range(scrolls):
                 # Прокручиваем с указанным шагом вместо полной высоты окна
                 scroll_position = scroll_step * (i + 1)
-                await page.evaluate(f'window.scrollTo(0, {scroll_position})')
+                await page.evaluate(_SCROLL_TO_JS, scroll_position)
                 self.logger.debug(f"Прокрутка {i+1}/{scrolls} до позиции {scroll_position}px")
                 
                 # Добавляем небольшое движение мыши для естественности
@@ -124,11 +131,11 @@ class InfoCasasParser(BaseParser):
                 await asyncio.sleep(delay)
                 
             # Финальная прокрутка в самый низ
-            await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+            await page.evaluate(_SCROLL_TO_BOTTOM_JS, 0)
             await asyncio.sleep(delay)
             
             # И немного вверх для естественности
-            await page.evaluate(f'window.scrollTo(0, document.body.scrollHeight - {viewport_height})')
+            await page.evaluate(_SCROLL_TO_BOTTOM_JS, viewport_height)
             
             self.logger.debug("Прокрутка завершена.")
             
@@ -147,14 +154,16 @@ class InfoCasasParser(BaseParser):
             self.logger.debug("Ожидание загрузки DOM (до 30 сек)...")
             await page.wait_for_load_state('domcontentloaded', timeout=30000)
             
-            # Затем ждем загрузки сетевых ресурсов с увеличенным таймаутом
-            self.logger.debug("Ожидание networkidle (до 60 сек)...")
-            await page.wait_for_load_state('networkidle', timeout=60000)
-            self.logger.debug("Состояние networkidle достигнуто.")
+            # Затем ждем появления первой карточки: networkidle на сайте с трекерами
+            # наступает намного позже отрисовки объявлений
+            self.logger.debug("Ожидание карточек объявлений (до 15 сек)...")
+            await page.wait_for_selector(self.list_selectors['card_container'], timeout=15000)
+            self.logger.debug("Карточки объявлений появились.")
             
-            # Сделаем скриншот для отладки
+            # Сделаем скриншот для отладки (только видимая область — полная
+            # страница требует прокрутки и склейки десятков экранов)
             screenshot_path = f"infocasas_page_{self.stats['pages_processed'] + 1}.png"
-            await page.screenshot(path=screenshot_path, full_page=True)
+            await page.screenshot(path=screenshot_path, full_page=False)
             self.logger.info(f"Сделан скриншот страницы: {screenshot_path}")
             
         except Exception as e:
@@ -320,9 +329,7 @@ class InfoCasasParser(BaseParser):
                   # Сохраняем проблемные данные для отладки
                   error_file = f"infocasas_error_data_{random.randint(1000, 9999)}.json"
                   try:
-                      import json
-                      with open(error_file, 'w') as f:
-                          json.dump(data_dict, f, default=str, indent=2)
+                      await self._write_json(error_file, data_dict)
                       self.logger.info(f"Сохранены проблемные данные: {error_file}")
                   except Exception as json_err:
                       self.logger.error(f"Не удалось сохранить проблемные данные: {json_err}")
@@ -15,22 +15,63 @@ from urllib.parse import urljoin
 from pathlib import Path
 
 from playwright.async_api import Page, ElementHandle, TimeoutError as PlaywrightTimeoutError
-from playwright.async_api import async_playwright
 
-from .base import BaseParser, RetryException
+from .base import BaseParser, RetryException, get_playwright
 from app.models import Listing
 from app.utils.ai_selectors import find_element_by_ai, smart_find_element
 
 # Получаем логгер
 logger = logging.getLogger(__name__)
 
+# Возвращает первый селектор из списка, для которого на странице есть элементы,
+# и число найденных элементов. Перебор выполняется в браузере за один вызов.
+_FIRST_MATCHING_SELECTOR_JS = """
+(selectors) => {
+    for (const selector of selectors) {
+        const count = document.querySelectorAll(selector).length;
+        if (count) return {selector, count};
+    }
+    return null;
+}
+"""
+
+# Скрипты, вызываемые на странице многократно. Параметры передаются аргументами,
+# а не подставляются в текст, поэтому исходник скрипта не меняется между вызовами
+# и компилируется браузером один раз.
+_PAGE_METRICS_JS = "() => ({viewport: window.innerHeight, height: document.body.scrollHeight})"
+_SMOOTH_SCROLL_JS = "(top) => window.scrollTo({top, behavior: 'smooth'})"
+_IMAGE_AVAILABLE_JS = """
+async (url) => {
+    try {
+        const resp = await fetch(url, { method: 'HEAD' });
+        return resp.ok;
+    } catch (e) {
+        return false;
+    }
+}
+"""
+
+# Возвращает текст первого элемента, содержащего площадь (м² или гектары)
+_FIRST_AREA_TEXT_JS = """
+(elements) => {
+    for (const el of elements) {
+        const text = el.innerText;
+        if (text && (text.includes('m²') || text.toLowerCase().includes('ha'))) return text;
+    }
+    return null;
+}
+"""
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_FIRST_NUMBER_RE = re.compile(r'(\d+[.,]?\d*)')
+
 # Вспомогательные функции, которые обычно находятся в отдельных модулях
 def clean_text(text: str) -> str:
     """Очищает текст от лишних пробелов и переносов строк."""
     if not text:
         return ""
     # Заменяем несколько пробелов на один
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     # Убираем пробелы в начале и конце
     return text.strip()
 
@@ -38,7 +79,7 @@ def extract_first_number(text: str) -> Optional[float]:
     """Извлекает первое число из текста."""
     if not text:
         return None
-    match = re.search(r'(\d+[.,]?\d*)', text)
+    match = _FIRST_NUMBER_RE.search(text)
     if match:
         number_str = match.group(1).replace(',', '.')
         try:
@@ -69,6 +110,7 @@ class MercadoLibreParser(BaseParser):
     MAX_CONCURRENT_DETAIL_PAGES = 4  # Максимальное количество одновременно открытых страниц деталей
     DETAIL_PAGE_TIMEOUT = 90000  # Таймаут для страницы деталей (мс)
     PAGE_LOAD_TIMEOUT = 60000  # Общий таймаут загрузки страницы (мс)
+    MAX_IMAGE_CANDIDATES = 20  # Максимальное количество изображений-кандидатов со страницы деталей
     
     # Селекторы для карточек объявлений
     CARD_SELECTORS = [
@@ -85,6 +127,8 @@ class MercadoLibreParser(BaseParser):
         'div.ui-search-breadcrumb',
         'nav.andes-breadcrumb'
     ]
+    # Составной селектор для одновременного ожидания любого из WAIT_SELECTORS
+    WAIT_SELECTOR = f":is({', '.join(WAIT_SELECTORS)})"
     
     # Индикаторы блокировки и каптчи
     CAPTCHA_INDICATORS = [
@@ -149,8 +193,8 @@ class MercadoLibreParser(BaseParser):
         try:
             self.logger.info(f"Инициализация браузера (headless={self.headless_mode})")
             
-            # Запускаем Playwright
-            playwright = await async_playwright().start()
+            # Используем общий драйвер Playwright
+            playwright = await get_playwright()
             
             # Создаем конфигурацию для запуска браузера
             browser_config = {
@@ -282,11 +326,10 @@ class MercadoLibreParser(BaseParser):
                 "div[class*='captcha']"
             ]
             
-            for selector in captcha_selectors:
-                element = await page.query_selector(selector)
-                if element:
-                    self.logger.warning(f"Обнаружен элемент каптчи: '{selector}'")
-                    return True
+            match = await page.evaluate(_FIRST_MATCHING_SELECTOR_JS, captcha_selectors)
+            if match:
+                self.logger.warning(f"Обнаружен элемент каптчи: '{match['selector']}'")
+                return True
                     
             return False
         except Exception as e:
@@ -393,14 +436,17 @@ class MercadoLibreParser(BaseParser):
             # Ждем загрузки DOM
             await page.wait_for_load_state("domcontentloaded")
             
-            # Пытаемся дождаться появления хотя бы одного из селекторов
-            for selector in self.WAIT_SELECTORS:
-                try:
-                    await page.wait_for_selector(selector, timeout=5000)
-                    self.logger.debug(f"Страница загружена, найден селектор: {selector}")
-                    break
-                except:
-                    continue
+            # Пытаемся дождаться появления хотя бы одного из селекторов.
+            # Все селекторы ожидаются одним составным :is(), поэтому ожидание
+            # завершается сразу при появлении любого из них, а не по очереди
+            try:
+                await page.wait_for_selector(
+                    self.WAIT_SELECTOR,
+                    timeout=5000 * len(self.WAIT_SELECTORS)
+                )
+                self.logger.debug("Страница загружена, найден один из селекторов ожидания")
+            except:
+                pass
             
             # Делаем дополнительную паузу для подгрузки динамического контента
             await asyncio.sleep(random.uniform(0.5, 1.5))
@@ -679,14 +725,11 @@ class MercadoLibreParser(BaseParser):
             
             # Если AI не сработал, пробуем обычные селекторы
             if 'area' not in listing_data:
-                area_elements = await card.query_selector_all(self.list_selectors['area'])
-                
-                for element in area_elements:
-                    area_text = await element.inner_text()
-                    if area_text and ('m²' in area_text or 'ha' in area_text.lower()):
-                        listing_data['area'] = area_text.strip()
-                        self.logger.debug(f"Карточка {index+1}: Площадь найдена по селектору: {area_text.strip()}")
-                        break
+                # Первый элемент с площадью выбирается в браузере одним вызовом
+                area_text = await card.eval_on_selector_all(self.list_selectors['area'], _FIRST_AREA_TEXT_JS)
+                if area_text:
+                    listing_data['area'] = area_text.strip()
+                    self.logger.debug(f"Карточка {index+1}: Площадь найдена по селектору: {area_text.strip()}")
             
             # 6. Извлечение URL изображения
             image_elem = await smart_find_element(card, "image", 
@@ -747,13 +790,13 @@ class MercadoLibreParser(BaseParser):
         # Пытаемся найти карточки объявлений
         for attempt in range(3):
             try:
-                # Попытка найти карточки через разные селекторы
-                for selector in self.CARD_SELECTORS:
-                    self.logger.debug(f"Попытка найти карточки через селектор: {selector}")
+                # Подбираем селектор карточек одним вызовом в браузере,
+                # затем получаем элементы только по найденному селектору
+                match = await page.evaluate(_FIRST_MATCHING_SELECTOR_JS, self.CARD_SELECTORS)
+                if match:
+                    selector = match['selector']
                     cards = await page.query_selector_all(selector)
-                    if cards:
-                        self.logger.debug(f"Найдено {len(cards)} карточек через селектор: {selector}")
-                        break
+                    self.logger.debug(f"Найдено {len(cards)} карточек через селектор: {selector}")
                 
                 # Если карточки не найдены, попробуем AI-селектор
                 if not cards:
@@ -972,21 +1015,9 @@ class MercadoLibreParser(BaseParser):
                         
                         # Проверяем доступность через HEAD-запрос
                         for img_url in img_urls:
-                            response = await page.evaluate(f"""
-                            async () => {{
-                                try {{
-                                    const resp = await fetch('{img_url}', {{ method: 'HEAD' }});
-                                    if (resp.ok) return '{img_url}';
-                                    return null;
-                                }} catch (e) {{
-                                    return null;
-                                }}
-                            }}
-                            """)
-                            
-                            if response:
-                                self.logger.info(f"Найдено изображение через извлеченный ID: {response}")
-                                return response
+                            if await page.evaluate(_IMAGE_AVAILABLE_JS, img_url):
+                                self.logger.info(f"Найдено изображение через извлеченный ID: {img_url}")
+                                return img_url
                     
                     # Если ID не найден или URL недоступен, пробуем прямую ссылку по ID объявления
                     img_templates = [
@@ -1000,21 +1031,9 @@ class MercadoLibreParser(BaseParser):
                     ]
                     
                     for img_url in img_templates:
-                        response = await page.evaluate(f"""
-                        async () => {{
-                            try {{
-                                const resp = await fetch('{img_url}', {{ method: 'HEAD' }});
-                                if (resp.ok) return '{img_url}';
-                                return null;
-                            }} catch (e) {{
-                                return null;
-                            }}
-                        }}
-                        """)
-                        
-                        if response:
-                            self.logger.info(f"Найдено изображение через API: {response}")
-                            return response
+                        if await page.evaluate(_IMAGE_AVAILABLE_JS, img_url):
+                            self.logger.info(f"Найдено изображение через API: {img_url}")
+                            return img_url
                     
                     # Если не нашли прямыми методами, ищем готовые URL в HTML
                     img_url_patterns = [
@@ -1038,7 +1057,7 @@ class MercadoLibreParser(BaseParser):
 
             # Метод 2: Использование JavaScript для поиска и ранжирования всех изображений
             js_script = """
-            () => {
+            (maxImages) => {
                 // Функция для проверки URL на валидность как изображение
                 const isValidImageUrl = (url) => {
                     if (!url) return false;
@@ -1213,27 +1232,20 @@ class MercadoLibreParser(BaseParser):
                     });
                 }
                 
-                // Возвращаем массив найденных изображений для проверки
-                return images.map(img => img.src);
+                // Возвращаем массив найденных изображений для проверки: одно изображение
+                // часто встречается в нескольких источниках, поэтому повторы убираются,
+                // а число кандидатов ограничивается
+                return [...new Set(images.map(img => img.src))].slice(0, maxImages);
             }
             """
-            images = await page.evaluate(js_script)
+            images = await page.evaluate(js_script, self.MAX_IMAGE_CANDIDATES)
             
             if images and len(images) > 0:
                 # Проверяем каждое изображение на доступность
                 for img_url in images:
                     try:
                         # Проверяем доступность через HEAD-запрос
-                        is_available = await page.evaluate(f"""
-                        async () => {{
-                            try {{
-                                const resp = await fetch('{img_url}', {{ method: 'HEAD' }});
-                                return resp.ok;
-                            }} catch (e) {{
-                                return false;
-                            }}
-                        }}
-                        """)
+                        is_available = await page.evaluate(_IMAGE_AVAILABLE_JS, img_url)
                         
                         if is_available:
                             self.logger.info(f"Подтверждено доступное изображение: {img_url[:50]}...")
@@ -1927,13 +1939,9 @@ class MercadoLibreParser(BaseParser):
                     try:
                         debug_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                         debug_path = f"errors/detail_debug_{debug_timestamp}.png"
-                        await page.screenshot(path=debug_path)
-                        self.logger.debug(f"Сохранен скриншот детальной страницы: {debug_path}")
-                        
                         html_path = f"errors/detail_html_{debug_timestamp}.html"
-                        content = await page.content()
-                        with open(html_path, "w", encoding="utf-8") as f:
-                            f.write(content)
+                        await self._save_debug_artifacts(page, debug_path, html_path)
+                        self.logger.debug(f"Сохранен скриншот детальной страницы: {debug_path}")
                         self.logger.debug(f"Сохранен HTML детальной страницы: {html_path}")
                     except Exception as debug_err:
                         self.logger.warning(f"Ошибка при сохранении отладочной информации: {debug_err}")
@@ -1945,13 +1953,9 @@ class MercadoLibreParser(BaseParser):
                 try:
                     debug_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     debug_path = f"errors/detail_error_{debug_timestamp}.png"
-                    await page.screenshot(path=debug_path)
-                    self.logger.info(f"Сохранен скриншот ошибки: {debug_path}")
-                    
                     html_path = f"errors/detail_error_{debug_timestamp}.html"
-                    content = await page.content()
-                    with open(html_path, "w", encoding="utf-8") as f:
-                        f.write(content)
+                    await self._save_debug_artifacts(page, debug_path, html_path)
+                    self.logger.info(f"Сохранен скриншот ошибки: {debug_path}")
                     self.logger.info(f"Сохранен HTML ошибки: {html_path}")
                 except Exception as debug_err:
                     self.logger.warning(f"Ошибка при сохранении отладочной информации: {debug_err}")
@@ -2067,12 +2071,14 @@ class MercadoLibreParser(BaseParser):
             
             # Если не смогли определить дату, используем JavaScript для поиска
             try:
+                # Фильтрация выполняется в браузере: через IPC передается только
+                # первый текст, указывающий на свежесть, а не тексты всех элементов
                 js_script = """
-                () => {
+                (recentKeywords) => {
                     // Ищем элементы с датой по ключевым словам
-                    const dateElements = Array.from(document.querySelectorAll('*')).filter(el => {
+                    for (const el of document.querySelectorAll('*')) {
                         const text = el.innerText && el.innerText.toLowerCase();
-                        return text && (
+                        const isDate = text && (
                             text.includes('publicado') || 
                             text.includes('fecha') || 
                             text.includes('hace') ||
@@ -2080,23 +2086,20 @@ class MercadoLibreParser(BaseParser):
                             text.includes('hoy') ||
                             text.includes('/20')  // Формат даты 
                         );
-                    });
-                    
-                    // Возвращаем тексты найденных элементов
-                    return dateElements.map(el => el.innerText.trim()).filter(Boolean);
+                        if (isDate && recentKeywords.some(keyword => text.includes(keyword))) {
+                            const dateText = el.innerText.trim();
+                            if (dateText) return dateText;
+                        }
+                    }
+                    return null;
                 }
                 """
-                date_texts = await page.evaluate(js_script)
+                recent_keywords = ['hoy', 'hora', 'horas', 'minutos', 'reciente']
+                date_text = await page.evaluate(js_script, recent_keywords)
                 
-                if date_texts and isinstance(date_texts, list) and len(date_texts) > 0:
-                    for date_text in date_texts:
-                        lower_text = date_text.lower()
-                        recent_keywords = ['hoy', 'hora', 'horas', 'minutos', 'reciente']
-                        
-                        for keyword in recent_keywords:
-                            if keyword in lower_text:
-                                self.logger.info(f"Найдено указание на свежесть объявления: {date_text}")
-                                return True
+                if date_text:
+                    self.logger.info(f"Найдено указание на свежесть объявления: {date_text}")
+                    return True
                 
                 # Если до сих пор не определили свежесть, считаем объявление не новым
                 return False
@@ -2110,6 +2113,23 @@ class MercadoLibreParser(BaseParser):
             return False  # В случае ошибки считаем объявление не новым
 
     # Вспомогательные методы остаются те же
+    async def _save_debug_artifacts(self, page: Page, screenshot_path: str, html_path: str):
+        """
+        Сохраняет скриншот и HTML страницы для отладки.
+        Скриншот и получение HTML независимы и выполняются параллельно,
+        HTML записывается на диск вне event loop.
+        
+        Args:
+            page: Объект страницы
+            screenshot_path: Путь для сохранения скриншота
+            html_path: Путь для сохранения HTML
+        """
+        _, content = await asyncio.gather(
+            page.screenshot(path=screenshot_path),
+            page.content()
+        )
+        await self._write_file(html_path, content)
+
     async def _safe_get_text_from_element(self, element: ElementHandle, selector: str, field_name: str, url: str) -> str:
         # ... (код без изменений)
         pass # Оставим как есть
@@ -2254,8 +2274,9 @@ class MercadoLibreParser(BaseParser):
             await asyncio.sleep(random.uniform(1, 3))
             
             # Медленный скроллинг вниз
-            viewport_height = await page.evaluate("window.innerHeight")
-            page_height = await page.evaluate("document.body.scrollHeight")
+            metrics = await page.evaluate(_PAGE_METRICS_JS)
+            viewport_height = metrics['viewport']
+            page_height = metrics['height']
             
             # Запустим скроллинг только если страница достаточно длинная
             if page_height > viewport_height * 1.5:
@@ -2267,12 +2288,7 @@ class MercadoLibreParser(BaseParser):
                     scroll_position = step * viewport_height * 0.8
                     
                     # Выполняем скролл с плавностью
-                    await page.evaluate(f"""
-                        window.scrollTo({{
-                            top: {scroll_position},
-                            behavior: 'smooth'
-                        }});
-                    """)
+                    await page.evaluate(_SMOOTH_SCROLL_JS, scroll_position)
                     
                     # Случайная пауза после скролла
                     await asyncio.sleep(random.uniform(1, 3))
@@ -2286,9 +2302,12 @@ class MercadoLibreParser(BaseParser):
             # Случайная вероятность нажатия на случайный не-ссылочный элемент (20% шанс)
             if random.random() < 0.2:
                 # Выбираем случайный неинтерактивный элемент (div, p, span)
-                random_elements = await page.query_selector_all("div:not(a):not(button), p:not(a), span:not(a)")
-                if random_elements and len(random_elements) > 0:
-                    random_element = random.choice(random_elements)
+                # Считаем подходящие элементы в браузере и получаем только один из них,
+                # не создавая handle для каждого div/p/span на странице
+                random_elements = page.locator("div:not(a):not(button), p:not(a), span:not(a)")
+                elements_count = await random_elements.count()
+                if elements_count > 0:
+                    random_element = random_elements.nth(random.randrange(elements_count))
                     # Получаем положение элемента
                     bbox = await random_element.bounding_box()
                     if bbox:
@@ -2300,7 +2319,7 @@ class MercadoLibreParser(BaseParser):
                         await asyncio.sleep(random.uniform(0.5, 1.5))
             
             # Возвращаемся наверх страницы
-            await page.evaluate("window.scrollTo({top: 0, behavior: 'smooth'})")
+            await page.evaluate(_SMOOTH_SCROLL_JS, 0)
             await asyncio.sleep(random.uniform(1, 2))
             
             self.logger.debug("Имитация человеческого поведения завершена")
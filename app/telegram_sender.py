@@ -6,13 +6,14 @@
 import os
 import logging
 import asyncio
-import requests
+import aiohttp
 from typing import List, Optional, Dict, Any, Set, Tuple
 from datetime import datetime
 from io import BytesIO
 from pydantic import HttpUrl
 from urllib.parse import urlparse
-import json
+import html
+import orjson
 import time
 from pathlib import Path
 
@@ -20,6 +21,53 @@ from app.models import Listing
 
 logger = logging.getLogger(__name__)
 
+# Максимальный размер загружаемого изображения (лимит Telegram для фото - 10 МБ)
+MAX_IMAGE_SIZE = 8 * 1024 * 1024
+
+# Заголовки запросов при загрузке изображений
+IMAGE_REQUEST_HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'),
+    'Accept': 'image/*'
+}
+
+def _escape_html(text: Any) -> str:
+    """Экранирует специальные символы HTML (<, >, &)"""
+    if not text:
+        return ""
+    return html.escape(str(text), quote=False)
+
+
+def _escape_href(url: str) -> str:
+    """Экранирует URL для атрибута href (в кавычках значимы только & и ")"""
+    return url.replace('&', '&amp;').replace('"', '&quot;')
+
+
+def _dedup_image_urls(urls: List[str], limit: int) -> List[str]:
+    """
+    Убирает повторяющиеся URL изображений, сохраняя порядок.
+    URL, отличающиеся только query-строкой, считаются одним изображением.
+    
+    Args:
+        urls: Список URL изображений
+        limit: Максимальное количество URL в результате
+        
+    Returns:
+        List[str]: Не более limit уникальных URL (в исходном виде)
+    """
+    seen: Set[str] = set()
+    unique_urls = []
+    for url in urls:
+        key = urlparse(url)._replace(query='').geturl()
+        if key in seen:
+            continue
+        seen.add(key)
+        unique_urls.append(url)
+        if len(unique_urls) >= limit:
+            break
+    return unique_urls
+
+
 class TelegramSender:
     """
     Класс для отправки объявлений о земельных участках в Telegram канал.
@@ -35,6 +83,7 @@ class TelegramSender:
         max_images_per_listing: int = 5,
         max_retries: int = 3,
         retry_delay: int = 2,
+        compact_every: int = 500,
     ):
         """
         Инициализация отправителя Telegram.
@@ -46,6 +95,7 @@ class TelegramSender:
             max_images_per_listing: Максимальное количество изображений для одного объявления
             max_retries: Максимальное количество повторных попыток при ошибке
             retry_delay: Задержка между повторными попытками (в секундах)
+            compact_every: Через сколько записей в журнале переписывать основной файл
         """
         self.bot_token = bot_token
         self.chat_id = chat_id
@@ -53,14 +103,54 @@ class TelegramSender:
         self.max_images_per_listing = max_images_per_listing
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.compact_every = compact_every
         
         # Множество URL-адресов отправленных объявлений
         self.sent_listings: Set[str] = set()
         
+        # Журнал отправленных URL (по одному в строке), дописывается после каждой
+        # отправки и периодически сворачивается в основной JSON-файл
+        self.sent_log_file = f"{sent_listings_file}.log"
+        self._sent_log = None
+        self._sent_log_entries = 0
+        
+        # URL объявлений, отправка которых выполняется прямо сейчас
+        self._in_flight: Set[str] = set()
+        
+        # Общая HTTP-сессия (создается при первом запросе)
+        self._session: Optional[aiohttp.ClientSession] = None
+        
         # Загружаем ранее отправленные объявления при инициализации
         self._ensure_cache_dir()
         self.load_sent_listings()
     
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую HTTP-сессию, создавая ее при необходимости"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=10, limit_per_host=5),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию и сворачивает журнал отправленных объявлений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        
+        if self._sent_log_entries:
+            self.save_sent_listings()
+        if self._sent_log is not None:
+            self._sent_log.close()
+            self._sent_log = None
+    
+    async def __aenter__(self) -> "TelegramSender":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
     def _ensure_cache_dir(self) -> None:
         """Убедиться, что директория для кэша существует"""
         cache_dir = os.path.dirname(self.sent_listings_file)
@@ -72,33 +162,62 @@ class TelegramSender:
         """Загрузить список ранее отправленных объявлений"""
         if not os.path.exists(self.sent_listings_file):
             logger.info(f"Файл с отправленными объявлениями не найден: {self.sent_listings_file}")
-            return
+        else:
+            try:
+                with open(self.sent_listings_file, 'rb') as f:
+                    data = orjson.loads(f.read())
+                    self.sent_listings = set(data.get('sent_urls', []))
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке отправленных объявлений: {e}")
+                self.sent_listings = set()
         
-        try:
-            with open(self.sent_listings_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.sent_listings = set(data.get('sent_urls', []))
-                
-            logger.info(f"Загружено {len(self.sent_listings)} ранее отправленных объявлений")
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке отправленных объявлений: {e}")
-            self.sent_listings = set()
+        # Дополняем записями из журнала, еще не свернутыми в основной файл
+        if os.path.exists(self.sent_log_file):
+            try:
+                with open(self.sent_log_file, 'r', encoding='utf-8') as f:
+                    self.sent_listings.update(line for line in f.read().splitlines() if line)
+            except Exception as e:
+                logger.error(f"Ошибка при чтении журнала отправленных объявлений: {e}")
+        
+        logger.info(f"Загружено {len(self.sent_listings)} ранее отправленных объявлений")
     
     def save_sent_listings(self) -> None:
-        """Сохранить список отправленных объявлений"""
+        """Сохранить список отправленных объявлений и очистить журнал"""
         try:
             data = {'sent_urls': list(self.sent_listings)}
             
-            with open(self.sent_listings_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(self.sent_listings_file, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            
+            # Все записи журнала теперь есть в основном файле
+            if self._sent_log is not None:
+                self._sent_log.close()
+                self._sent_log = None
+            if os.path.exists(self.sent_log_file):
+                os.remove(self.sent_log_file)
+            self._sent_log_entries = 0
                 
             logger.debug(f"Сохранено {len(self.sent_listings)} отправленных объявлений")
         except Exception as e:
             logger.error(f"Ошибка при сохранении отправленных объявлений: {e}")
     
+    def _mark_sent(self, url: str) -> None:
+        """Отметить объявление как отправленное, дописав URL в журнал"""
+        self.sent_listings.add(url)
+        try:
+            if self._sent_log is None:
+                self._sent_log = open(self.sent_log_file, 'a', encoding='utf-8', buffering=1)
+            self._sent_log.write(url + '\n')
+            self._sent_log_entries += 1
+        except Exception as e:
+            logger.error(f"Ошибка при записи в журнал отправленных объявлений: {e}")
+        
+        if self._sent_log_entries >= self.compact_every:
+            self.save_sent_listings()
+    
     def format_message(self, listing: Listing) -> str:
         """
-        Форматирует сообщение для Telegram с использованием Markdown V2.
+        Форматирует сообщение для Telegram с HTML-разметкой.
         
         Args:
             listing: Объект объявления
@@ -106,43 +225,37 @@ class TelegramSender:
         Returns:
             str: Отформатированное сообщение
         """
-        # Экранирование специальных символов для Markdown V2
-        def escape_md(text):
-            if not text:
-                return ""
-            chars = '_*[]()~`>#+-=|{}.!'
-            return ''.join(f'\\{c}' if c in chars else c for c in str(text))
-        
         # Форматирование заголовка
-        title = f"*🌱 {escape_md(listing.title)}*" if listing.title else "*🌱 Земельный участок*"
+        title = f"<b>🌱 {_escape_html(listing.title)}</b>" if listing.title else "<b>🌱 Земельный участок</b>"
         
         # Форматирование цены
         price_line = ""
         if listing.price:
             currency = listing.price_currency if listing.price_currency else "USD"
             price_formatted = f"{int(listing.price):,}".replace(',', ' ')
-            price_line = f"💰 *Цена:* {escape_md(price_formatted)} {escape_md(currency)}\n"
+            price_line = f"💰 <b>Цена:</b> {price_formatted} {_escape_html(currency)}\n"
             
             # Добавляем цену за м² если есть площадь
             if listing.price_per_sqm and listing.price_per_sqm > 0:
-                price_per_sqm = f"{listing.price_per_sqm:.1f}".replace('.0', '')
-                price_line += f"📊 *Цена за м²:* {escape_md(price_per_sqm)} {escape_md(currency)}/м²\n"
+                price_per_sqm = f"{listing.price_per_sqm:.1f}".rstrip('0').rstrip('.')
+                price_line += f"📊 <b>Цена за м²:</b> {price_per_sqm} {_escape_html(currency)}/м²\n"
         
         # Форматирование площади
         area_line = ""
         if listing.area:
-            area_formatted = f"{listing.area:,}".replace(',', ' ').replace('.0', '')
-            area_line = f"📏 *Площадь:* {escape_md(area_formatted)} м²\n"
+            area_formatted = f"{listing.area:,}".replace(',', ' ')
+            area_line = f"📏 <b>Площадь:</b> {area_formatted} м²\n"
             
             # Переводим в гектары если площадь больше 10000 м²
             if listing.area >= 10000:
                 hectares = listing.area / 10000
-                area_line += f"🌳 *Площадь:* {escape_md(f'{hectares:.2f}'.replace('.00', ''))} га\n"
+                hectares_formatted = f"{hectares:.2f}".rstrip('0').rstrip('.')
+                area_line += f"🌳 <b>Площадь:</b> {hectares_formatted} га\n"
         
         # Форматирование местоположения
         location_line = ""
         if listing.location:
-            location_line = f"📍 *Расположение:* {escape_md(listing.location)}\n"
+            location_line = f"📍 <b>Расположение:</b> {_escape_html(listing.location)}\n"
         
         # Форматирование коммуникаций и характеристик
         features = []
@@ -161,12 +274,12 @@ class TelegramSender:
             features.append("🌐 Интернет")
         
         if listing.zoning:
-            features.append(f"🏠 {escape_md(listing.zoning)}")
+            features.append(f"🏠 {_escape_html(listing.zoning)}")
         
         features_line = ""
         if features:
             features_text = " · ".join(features)
-            features_line = f"🔧 *Характеристики:* {features_text}\n"
+            features_line = f"🔧 <b>Характеристики:</b> {features_text}\n"
         
         # Добавляем описание с ограничением по длине
         description_line = ""
@@ -177,24 +290,24 @@ class TelegramSender:
             if len(description) > max_desc_length:
                 description = description[:max_desc_length].strip() + "..."
                 
-            description_line = f"\n📝 {escape_md(description)}\n"
+            description_line = f"\n📝 {_escape_html(description)}\n"
         
         # Добавляем источник и дату публикации
         source_line = ""
         if listing.source:
             source_name = listing.source.replace("mercadolibre", "MercadoLibre")
             source_name = source_name.replace("infocasas", "InfoCasas")
-            source_line = f"🔍 *Источник:* {escape_md(source_name)}"
+            source_line = f"🔍 <b>Источник:</b> {_escape_html(source_name)}"
             
             if listing.crawled_at:
                 crawled_date = listing.crawled_at.strftime("%d.%m.%Y")
-                source_line += f" · {escape_md(crawled_date)}"
+                source_line += f" · {crawled_date}"
         
         # Формируем ссылку на оригинальное объявление
-        url_line = f"\n[Открыть объявление]({escape_md(listing.url)})"
+        url_line = f'\n<a href="{_escape_href(listing.url)}">Открыть объявление</a>'
         
         # Собираем все компоненты сообщения
-        message_parts = [
+        message_parts = (
             title,
             "\n",
             price_line,
@@ -204,13 +317,14 @@ class TelegramSender:
             description_line,
             source_line,
             url_line
-        ]
+        )
         
         return "".join(message_parts)
     
     async def download_image(self, url: str) -> Optional[bytes]:
         """
-        Загружает изображение по URL.
+        Загружает изображение по URL. Изображения больше MAX_IMAGE_SIZE
+        не загружаются целиком и отбрасываются.
         
         Args:
             url: URL изображения
@@ -218,14 +332,29 @@ class TelegramSender:
         Returns:
             Optional[bytes]: Данные изображения или None в случае ошибки
         """
+        session = await self._ensure_session()
+        
         for attempt in range(1, self.max_retries + 1):
             try:
-                response = requests.get(url, timeout=15)
-                if response.status_code == 200:
-                    logger.debug(f"Успешно загружено изображение: {url}")
-                    return response.content
-                else:
-                    logger.warning(f"Ошибка при загрузке изображения: {url}, статус: {response.status_code}")
+                async with session.get(url, headers=IMAGE_REQUEST_HEADERS,
+                                       timeout=aiohttp.ClientTimeout(total=15)) as response:
+                    if response.status == 200:
+                        if response.content_length and response.content_length > MAX_IMAGE_SIZE:
+                            logger.warning(f"Изображение слишком большое ({response.content_length} байт): {url}")
+                            return None
+                        
+                        # Читаем по частям, прерываясь при превышении лимита
+                        data = bytearray()
+                        async for chunk in response.content.iter_chunked(64 * 1024):
+                            data.extend(chunk)
+                            if len(data) > MAX_IMAGE_SIZE:
+                                logger.warning(f"Изображение превышает {MAX_IMAGE_SIZE} байт: {url}")
+                                return None
+                        
+                        logger.debug(f"Успешно загружено изображение: {url}")
+                        return bytes(data)
+                    else:
+                        logger.warning(f"Ошибка при загрузке изображения: {url}, статус: {response.status}")
             except Exception as e:
                 logger.warning(f"Ошибка при загрузке изображения ({attempt}/{self.max_retries}): {url}, {e}")
                 
@@ -254,20 +383,29 @@ class TelegramSender:
             logger.info(f"Объявление уже было отправлено ранее: {listing.url}")
             return False
         
+        # Это же объявление уже отправляется параллельно
+        if listing.url in self._in_flight:
+            logger.info(f"Объявление уже отправляется: {listing.url}")
+            return False
+        
         # Форматируем сообщение
         message_text = self.format_message(listing)
         
+        self._in_flight.add(listing.url)
         try:
             # API URL для отправки сообщения
             api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMediaGroup"
             
-            # Загружаем изображения
+            session = await self._ensure_session()
+            
+            # Загружаем изображения параллельно
             images = []
             if listing.images:
-                for i, img_url in enumerate(listing.images[:self.max_images_per_listing]):
-                    image_data = await self.download_image(img_url)
-                    if image_data:
-                        images.append(image_data)
+                downloaded = await asyncio.gather(
+                    *(self.download_image(img_url)
+                      for img_url in _dedup_image_urls(listing.images, self.max_images_per_listing))
+                )
+                images = [image_data for image_data in downloaded if image_data]
             
             # Если есть изображения, отправляем их группой
             if images:
@@ -278,7 +416,7 @@ class TelegramSender:
                     'type': 'photo',
                     'media': f'attach://photo0',
                     'caption': message_text,
-                    'parse_mode': 'MarkdownV2'
+                    'parse_mode': 'HTML'
                 })
                 
                 # Остальные изображения
@@ -288,29 +426,30 @@ class TelegramSender:
                         'media': f'attach://photo{i}'
                     })
                 
-                # Формируем данные для отправки
-                files = {}
-                for i, img_data in enumerate(images):
-                    files[f'photo{i}'] = img_data
-                
-                # Параметры запроса
-                params = {
-                    'chat_id': self.chat_id,
-                    'media': json.dumps(media)
-                }
+                # Параметры запроса сериализуем один раз для всех попыток
+                # и передаем в теле запроса, а не в query-строке
+                media_json = orjson.dumps(media).decode()
+                chat_id = str(self.chat_id)
                 
                 # Отправляем группу изображений
                 for attempt in range(1, self.max_retries + 1):
                     try:
-                        response = requests.post(api_url, params=params, files=files, timeout=30)
-                        if response.status_code == 200:
-                            logger.info(f"Объявление успешно отправлено в Telegram: {listing.url}")
-                            self.sent_listings.add(listing.url)
-                            self.save_sent_listings()
-                            return True
-                        else:
-                            logger.warning(f"Ошибка при отправке объявления в Telegram: {listing.url}, "
-                                          f"статус: {response.status_code}, ответ: {response.text}")
+                        # FormData одноразовая, поэтому собираем ее на каждую попытку;
+                        # байты изображений при этом не копируются
+                        form = aiohttp.FormData()
+                        form.add_field('chat_id', chat_id)
+                        form.add_field('media', media_json)
+                        for i, img_data in enumerate(images):
+                            form.add_field(f'photo{i}', img_data, filename=f'photo{i}')
+                        
+                        async with session.post(api_url, data=form) as response:
+                            if response.status == 200:
+                                logger.info(f"Объявление успешно отправлено в Telegram: {listing.url}")
+                                self._mark_sent(listing.url)
+                                return True
+                            else:
+                                logger.warning(f"Ошибка при отправке объявления в Telegram: {listing.url}, "
+                                              f"статус: {response.status}, ответ: {await response.text()}")
                     except Exception as e:
                         logger.warning(f"Ошибка при отправке объявления в Telegram ({attempt}/{self.max_retries}): "
                                       f"{listing.url}, {e}")
@@ -324,21 +463,20 @@ class TelegramSender:
             params = {
                 'chat_id': self.chat_id,
                 'text': message_text,
-                'parse_mode': 'MarkdownV2',
+                'parse_mode': 'HTML',
                 'disable_web_page_preview': False  # Включаем предпросмотр страницы
             }
             
             for attempt in range(1, self.max_retries + 1):
                 try:
-                    response = requests.post(api_url, json=params, timeout=15)
-                    if response.status_code == 200:
-                        logger.info(f"Текстовое сообщение успешно отправлено в Telegram: {listing.url}")
-                        self.sent_listings.add(listing.url)
-                        self.save_sent_listings()
-                        return True
-                    else:
-                        logger.warning(f"Ошибка при отправке текстового сообщения в Telegram: {listing.url}, "
-                                      f"статус: {response.status_code}, ответ: {response.text}")
+                    async with session.post(api_url, json=params, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                        if response.status == 200:
+                            logger.info(f"Текстовое сообщение успешно отправлено в Telegram: {listing.url}")
+                            self._mark_sent(listing.url)
+                            return True
+                        else:
+                            logger.warning(f"Ошибка при отправке текстового сообщения в Telegram: {listing.url}, "
+                                          f"статус: {response.status}, ответ: {await response.text()}")
                 except Exception as e:
                     logger.warning(f"Ошибка при отправке текстового сообщения в Telegram ({attempt}/{self.max_retries}): "
                                   f"{listing.url}, {e}")
@@ -349,41 +487,64 @@ class TelegramSender:
             
         except Exception as e:
             logger.error(f"Непредвиденная ошибка при отправке объявления в Telegram: {listing.url}, {e}")
+        finally:
+            self._in_flight.discard(listing.url)
         
         return False
     
-    async def send_listings(self, listings: List[Listing], delay: float = 2.0) -> Tuple[int, int]:
+    async def send_listings(
+        self,
+        listings: List[Listing],
+        delay: float = 2.0,
+        max_concurrent: int = 5
+    ) -> Tuple[int, int]:
         """
-        Отправляет список объявлений в Telegram с задержкой между сообщениями.
+        Отправляет список объявлений в Telegram, обрабатывая несколько объявлений
+        одновременно и выдерживая интервал между началом отправок.
         
         Args:
             listings: Список объявлений
-            delay: Задержка между отправками сообщений (в секундах)
+            delay: Минимальный интервал между началом отправки сообщений (в секундах)
+            max_concurrent: Максимальное количество одновременно отправляемых объявлений
             
         Returns:
             Tuple[int, int]: Количество успешно отправленных и пропущенных объявлений
         """
-        sent_count = 0
         skipped_count = 0
+        pending: Dict[str, Listing] = {}
         
         for listing in listings:
-            # Проверяем, было ли объявление уже отправлено
+            # Уже отправленные объявления не ставим в очередь, чтобы не ждать интервал
             if listing.url in self.sent_listings:
                 logger.debug(f"Пропуск объявления (уже отправлено): {listing.url}")
                 skipped_count += 1
                 continue
-            
-            # Отправляем объявление
-            success = await self.send_listing(listing)
-            
-            if success:
-                sent_count += 1
-            else:
+            # Повторы внутри пакета отправляем один раз
+            if listing.url in pending:
+                logger.debug(f"Пропуск объявления (повтор в пакете): {listing.url}")
                 skipped_count += 1
-            
-            # Задержка между отправками для избежания ограничений API
-            if delay > 0 and listings.index(listing) < len(listings) - 1:
-                await asyncio.sleep(delay)
+                continue
+            pending[listing.url] = listing
+        
+        semaphore = asyncio.Semaphore(max_concurrent)
+        throttle = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+        next_start = loop.time()
+        
+        async def send_one(listing: Listing) -> bool:
+            nonlocal next_start
+            async with semaphore:
+                # Интервал между отправками для избежания ограничений API
+                async with throttle:
+                    now = loop.time()
+                    if next_start > now:
+                        await asyncio.sleep(next_start - now)
+                    next_start = max(now, next_start) + delay
+                return await self.send_listing(listing)
+        
+        results = await asyncio.gather(*(send_one(listing) for listing in pending.values()))
+        sent_count = sum(1 for success in results if success)
+        skipped_count += len(results) - sent_count
         
         logger.info(f"Отправлено {sent_count} объявлений, пропущено {skipped_count} объявлений")
         return sent_count, skipped_count
@@ -410,13 +571,14 @@ class TelegramSender:
         }
         
         try:
-            response = requests.post(api_url, json=params, timeout=15)
-            if response.status_code == 200:
-                logger.info("Тестовое сообщение успешно отправлено")
-                return True
-            else:
-                logger.error(f"Ошибка при отправке тестового сообщения: "
-                           f"статус {response.status_code}, ответ: {response.text}")
+            session = await self._ensure_session()
+            async with session.post(api_url, json=params, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                if response.status == 200:
+                    logger.info("Тестовое сообщение успешно отправлено")
+                    return True
+                else:
+                    logger.error(f"Ошибка при отправке тестового сообщения: "
+                               f"статус {response.status}, ответ: {await response.text()}")
         except Exception as e:
             logger.error(f"Ошибка при отправке тестового сообщения: {e}")
         
@@ -455,13 +617,12 @@ async def test_telegram_sender():
     )
     
     # Создаем отправителя
-    sender = TelegramSender(bot_token=bot_token, chat_id=chat_id)
-    
-    # Отправляем тестовое сообщение
-    await sender.send_test_message("🧪 Тестирование отправки объявлений")
-    
-    # Отправляем тестовое объявление
-    success = await sender.send_listing(test_listing)
+    async with TelegramSender(bot_token=bot_token, chat_id=chat_id) as sender:
+        # Отправляем тестовое сообщение
+        await sender.send_test_message("🧪 Тестирование отправки объявлений")
+        
+        # Отправляем тестовое объявление
+        success = await sender.send_listing(test_listing)
     
     if success:
         logger.info("✅ Тестовое объявление успешно отправлено")
@@ -4,14 +4,56 @@
 с использованием семантического понимания контента.
 """
 
+import functools
 import logging
 import re
 import json
 from typing import List, Dict, Any, Union, Optional, Tuple, Set
 from playwright.async_api import Page, ElementHandle, Locator
 
+# Функции модуля вызываются для каждого поля каждой карточки, поэтому сообщения
+# логируются с ленивым %-форматированием: строка не собирается, если уровень отключен
 logger = logging.getLogger(__name__)
 
+# Атрибуты, по которым элемент проверяется на ключевые слова
+_KEYWORD_ATTRIBUTES = ['title', 'alt', 'placeholder', 'name', 'id', 'aria-label']
+
+# Подбор паттерна выполняется в браузере за один вызов: паттерны перебираются по порядку,
+# возвращается индекс первого паттерна с подходящими элементами и, если заданы
+# ключевые слова, флаг для каждого элемента (текст или один из атрибутов содержит
+# ключевое слово). Некорректные селекторы пропускаются. Если не подходит ни один
+# паттерн, это определяется одним составным запросом :is().
+_RESOLVE_PATTERN_JS = """
+(root, [patterns, keywords, attrs, compound]) => {
+    const hasKeyword = value => {
+        if (!value) return false;
+        const lower = value.toLowerCase();
+        return keywords.some(kw => lower.includes(kw));
+    };
+    // Один составной запрос отсекает случай, когда не подходит ни один паттерн
+    try {
+        if (!root.querySelector(compound)) return null;
+    } catch (e) {
+        // Некорректный паттерн в списке — проверяем паттерны по отдельности
+    }
+    for (let index = 0; index < patterns.length; index++) {
+        let elements;
+        try {
+            elements = Array.from(root.querySelectorAll(patterns[index]));
+        } catch (e) {
+            continue;
+        }
+        if (!elements.length) continue;
+        if (keywords === null) return {index, mask: null};
+        const mask = elements.map(el =>
+            hasKeyword(el.innerText || '') || attrs.some(attr => hasKeyword(el.getAttribute(attr)))
+        );
+        if (mask.some(Boolean)) return {index, mask};
+    }
+    return null;
+}
+"""
+
 class AISelector:
     """
     Класс для интеллектуального выбора элементов на основе их смыслового содержания.
@@ -152,6 +194,28 @@ class AISelector:
         # Возвращаем пустой список, если не нашли подходящих ключевых слов
         return []
         
+@functools.lru_cache(maxsize=None)
+def _get_resolve_arg(element_type: str, with_keywords: bool) -> Optional[tuple]:
+    """
+    Возвращает аргумент для _RESOLVE_PATTERN_JS: паттерны, ключевые слова в нижнем
+    регистре (или None), проверяемые атрибуты и составной селектор :is() из всех
+    паттернов. Набор типов элементов невелик, поэтому аргумент строится один раз на тип.
+    
+    Args:
+        element_type: Тип искомого элемента
+        with_keywords: Нужна ли фильтрация по ключевым словам
+        
+    Returns:
+        Кортеж с аргументом или None, если для типа нет паттернов
+    """
+    patterns = AISelector.get_patterns_for_type(element_type)
+    if not patterns:
+        return None
+    keywords = None
+    if with_keywords:
+        keywords = [kw.lower() for kw in AISelector.get_keywords_for_type(element_type)]
+    return (patterns, keywords, _KEYWORD_ATTRIBUTES, f":is({', '.join(patterns)})")
+
 async def find_element_by_ai(page_or_element: Union[Page, ElementHandle], 
                             element_type: str, 
                             query: str = None) -> Union[ElementHandle, List[ElementHandle], None]:
@@ -166,67 +230,50 @@ async def find_element_by_ai(page_or_element: Union[Page, ElementHandle],
     Returns:
         Найденный элемент, список элементов или None если ничего не найдено
     """
-    logger.info(f"AI-поиск элемента типа: {element_type}, контекст: {query}")
+    logger.info("AI-поиск элемента типа: %s, контекст: %s", element_type, query)
     
-    # Получаем паттерны для указанного типа элемента
-    patterns = AISelector.get_patterns_for_type(element_type)
+    # Получаем паттерны и ключевые слова для указанного типа элемента
+    arg = _get_resolve_arg(element_type, bool(query))
     
-    if not patterns:
-        logger.warning(f"Не найдены паттерны для типа элемента: {element_type}")
+    if arg is None:
+        logger.warning("Не найдены паттерны для типа элемента: %s", element_type)
         return None
+    patterns = arg[0]
     
-    # Пробуем найти элемент по каждому паттерну
-    for pattern in patterns:
-        try:
-            # Пробуем найти элемент по селектору
-            if isinstance(page_or_element, Page):
-                elements = await page_or_element.query_selector_all(pattern)
-            else:
-                elements = await page_or_element.query_selector_all(pattern)
-                
-            if elements and len(elements) > 0:
-                # Если нашли элементы, проверяем их содержимое если есть query
-                if query:
-                    # Фильтруем элементы по тексту, который соответствует запросу
-                    filtered_elements = []
-                    keywords = AISelector.get_keywords_for_type(element_type)
-                    
-                    for element in elements:
-                        # Проверяем текст
-                        try:
-                            text = await element.inner_text()
-                            
-                            # Проверяем на соответствие ключевым словам и запросу
-                            if any(kw.lower() in text.lower() for kw in keywords):
-                                filtered_elements.append(element)
-                                continue
-                                
-                            # Проверяем атрибуты
-                            for attr in ['title', 'alt', 'placeholder', 'name', 'id', 'aria-label']:
-                                attr_value = await element.get_attribute(attr)
-                                if attr_value and any(kw.lower() in attr_value.lower() for kw in keywords):
-                                    filtered_elements.append(element)
-                                    break
-                        except:
-                            pass
-                            
-                    if filtered_elements:
-                        if len(filtered_elements) == 1:
-                            return filtered_elements[0]
-                        else:
-                            return filtered_elements
-                else:
-                    # Если запрос не указан, возвращаем все найденные элементы
-                    if len(elements) == 1:
-                        return elements[0]
-                    else:
-                        return elements
-        except Exception as e:
-            logger.error(f"Ошибка при поиске по паттерну {pattern}: {e}")
-            continue
-            
-    # Если ни один паттерн не сработал, возвращаем None
-    return None
+    # Находим первый подходящий паттерн одним вызовом в браузере
+    # вместо query_selector_all и проверки элементов для каждого паттерна
+    try:
+        if isinstance(page_or_element, Page):
+            resolved = await page_or_element.eval_on_selector(':root', _RESOLVE_PATTERN_JS, arg)
+        else:
+            resolved = await page_or_element.evaluate(_RESOLVE_PATTERN_JS, arg)
+    except Exception as e:
+        logger.error("Ошибка при подборе паттерна для типа %s: %s", element_type, e)
+        return None
+    
+    if not resolved:
+        return None
+    
+    pattern = patterns[resolved['index']]
+    try:
+        elements = await page_or_element.query_selector_all(pattern)
+    except Exception as e:
+        logger.error("Ошибка при поиске по паттерну %s: %s", pattern, e)
+        return None
+    
+    mask = resolved['mask']
+    if mask is not None:
+        # DOM мог измениться между запросами — сопоставляем только при совпадении длины
+        if len(mask) != len(elements):
+            return None
+        # Оставляем элементы, которые соответствуют запросу
+        elements = [element for element, matched in zip(elements, mask) if matched]
+    
+    if not elements:
+        return None
+    if len(elements) == 1:
+        return elements[0]
+    return elements
 
 async def smart_find_element(page_or_element: Union[Page, ElementHandle], 
                            element_type: str, 
@@ -259,9 +306,60 @@ async def smart_find_element(page_or_element: Union[Page, ElementHandle],
                 pass
     
     # Если не нашли, используем AI-селекторы
-    logger.info(f"Традиционные селекторы не сработали, используем AI-селекторы для поиска: {query or element_type}")
+    logger.info("Традиционные селекторы не сработали, используем AI-селекторы для поиска: %s", query or element_type)
     return await find_element_by_ai(page_or_element, element_type, query)
 
+# Регулярные выражения для извлечения характеристик участка из описания.
+# Компилируются один раз при импорте модуля
+_LAND_CHARACTERISTIC_PATTERNS = {
+    "area": [
+        r'(\d+[\.,]?\d*)\s*(?:m2|m²|metros|metros cuadrados)',
+        r'(\d+[\.,]?\d*)\s*(?:ha|hás|hectáreas|hectareas)',
+        r'superficie\D*(\d+[\.,]?\d*)',
+        r'área\D*(\d+[\.,]?\d*)',
+        r'area\D*(\d+[\.,]?\d*)',
+        r'(\d+[\.,]?\d*)\s*hectáreas',
+        r'(\d+[\.,]?\d*)\s*hectareas',
+    ],
+    "utilities": [
+        r'servicios\s*[:-]?\s*([^\.]+)',
+        r'servicios\W+([\w\s,]+)',
+        r'luz\W+([\w\s,]+)',
+        r'agua\W+([\w\s,]+)',
+        r'electricidad\W+([\w\s,]+)',
+    ],
+    "topography": [
+        r'topografía\s*[:-]?\s*([^\.]+)',
+        r'topografia\s*[:-]?\s*([^\.]+)',
+        r'relieve\s*[:-]?\s*([^\.]+)',
+    ],
+    "zoning": [
+        r'zona\s*[:-]?\s*([^\.]+)',
+        r'zonificación\s*[:-]?\s*([^\.]+)',
+        r'zonificacion\s*[:-]?\s*([^\.]+)',
+        r'categoría\s*[:-]?\s*([^\.]+)',
+    ],
+    "access_road": [
+        r'acceso\s*[:-]?\s*([^\.]+)',
+        r'calle\s*[:-]?\s*([^\.]+)',
+        r'camino\s*[:-]?\s*([^\.]+)',
+    ],
+    "water_source": [
+        r'agua\s*[:-]?\s*([^\.]+)',
+        r'pozo\s*[:-]?\s*([^\.]+)',
+        r'(\w+\s+\w+)\s*de agua',
+    ],
+    "distance_to_city": [
+        r'a\s+(\d+[\.,]?\d*)\s*(?:km|kilómetros|kilometros)',
+        r'distancia\s*[:-]?\s*(\d+[\.,]?\d*)',
+        r'a\s+(\d+)\s*minutos',
+    ]
+}
+_LAND_CHARACTERISTIC_RES = {
+    char_type: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+    for char_type, patterns in _LAND_CHARACTERISTIC_PATTERNS.items()
+}
+
 # Функция для извлечения характеристик участков из текста описания
 async def extract_land_characteristics(description_text: str) -> Dict[str, Any]:
     """
@@ -295,56 +393,13 @@ async def extract_land_characteristics(description_text: str) -> Dict[str, Any]:
         "distance_to_city": ["distancia", "km", "kilómetros", "kilometros", "minutos", "centro", "ciudad"]
     }
     
-    # Регулярные выражения для извлечения различных данных
-    regex_patterns = {
-        "area": [
-            r'(\d+[\.,]?\d*)\s*(?:m2|m²|metros|metros cuadrados)',
-            r'(\d+[\.,]?\d*)\s*(?:ha|hás|hectáreas|hectareas)',
-            r'superficie\D*(\d+[\.,]?\d*)',
-            r'área\D*(\d+[\.,]?\d*)',
-            r'area\D*(\d+[\.,]?\d*)',
-            r'(\d+[\.,]?\d*)\s*hectáreas',
-            r'(\d+[\.,]?\d*)\s*hectareas',
-        ],
-        "utilities": [
-            r'servicios\s*[:-]?\s*([^\.]+)',
-            r'servicios\W+([\w\s,]+)',
-            r'luz\W+([\w\s,]+)',
-            r'agua\W+([\w\s,]+)',
-            r'electricidad\W+([\w\s,]+)',
-        ],
-        "topography": [
-            r'topografía\s*[:-]?\s*([^\.]+)',
-            r'topografia\s*[:-]?\s*([^\.]+)',
-            r'relieve\s*[:-]?\s*([^\.]+)',
-        ],
-        "zoning": [
-            r'zona\s*[:-]?\s*([^\.]+)',
-            r'zonificación\s*[:-]?\s*([^\.]+)',
-            r'zonificacion\s*[:-]?\s*([^\.]+)',
-            r'categoría\s*[:-]?\s*([^\.]+)',
-        ],
-        "access_road": [
-            r'acceso\s*[:-]?\s*([^\.]+)',
-            r'calle\s*[:-]?\s*([^\.]+)',
-            r'camino\s*[:-]?\s*([^\.]+)',
-        ],
-        "water_source": [
-            r'agua\s*[:-]?\s*([^\.]+)',
-            r'pozo\s*[:-]?\s*([^\.]+)',
-            r'(\w+\s+\w+)\s*de agua',
-        ],
-        "distance_to_city": [
-            r'a\s+(\d+[\.,]?\d*)\s*(?:km|kilómetros|kilometros)',
-            r'distancia\s*[:-]?\s*(\d+[\.,]?\d*)',
-            r'a\s+(\d+)\s*minutos',
-        ]
-    }
+    # Текст приводится к нижнему регистру один раз для всех выражений
+    description_lower = description_text.lower()
     
     # Для каждой характеристики применяем соответствующие регулярные выражения
-    for char_type, patterns in regex_patterns.items():
+    for char_type, patterns in _LAND_CHARACTERISTIC_RES.items():
         for pattern in patterns:
-            matches = re.search(pattern, description_text.lower(), re.IGNORECASE)
+            matches = pattern.search(description_lower)
             if matches:
                 if char_type == "utilities":
                     # Для коммуникаций собираем список
@@ -357,7 +412,7 @@ async def extract_land_characteristics(description_text: str) -> Dict[str, Any]:
                 
     # Также проверяем наличие ключевых слов для коммуникаций
     for keyword in ["luz", "agua", "electricidad", "OSE", "UTE", "saneamiento", "gas"]:
-        if keyword in description_text.lower() and keyword not in characteristics["utilities"]:
+        if keyword in description_lower and keyword not in characteristics["utilities"]:
             characteristics["utilities"].append(keyword)
             
     # Приведение значений к правильному формату
@@ -4,161 +4,227 @@
 """
 
 import os
-import json
+import csv
+import functools
 import logging
-import statistics
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import sys
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from collections import Counter
+import numpy as np
+import orjson
 from app.models import Listing
+from app.utils.parsing import extract_price_number
 
 logger = logging.getLogger(__name__)
 
+# Шаблон для извлечения числа и единицы измерения из строки площади
+_AREA_RE = re.compile(r'([\d.,]+)\s*([hm²])', re.IGNORECASE)
+# Разделитель списка удобств: запятая вместе с окружающими пробелами
+_UTILITIES_SPLIT_RE = re.compile(r'\s*,\s*')
+# Флаги коммуникаций модели Listing -> название (как в парсерах)
+_UTILITY_FLAGS = (
+    ("has_water", "Вода"),
+    ("has_electricity", "Электричество"),
+    ("has_internet", "Интернет")
+)
+
+# Колонки CSV-файла истории цен
+PRICE_HISTORY_FIELDS = ("date", "count", "min", "max", "median", "average")
+
+# --- Разбор полей объявления ---
+# Одни и те же строки площади и местоположения повторяются от объявления
+# к объявлению, поэтому результаты разбора кэшируются (цена разбирается
+# общей функцией extract_price_number)
+@functools.lru_cache(maxsize=65536)
+def _extract_area_number(area: Union[str, int, float, None]) -> Optional[float]:
+    """
+    Извлекает числовое значение площади из строки или числа.
+    
+    Args:
+        area: Площадь, например '1000 m²', '5 ha' или 1000 (в м²)
+        
+    Returns:
+        Optional[float]: Числовое значение площади в м² или None, если не удалось извлечь
+    """
+    if not area:
+        return None
+    
+    # Площадь уже может быть числом в м² (поле area модели Listing)
+    if isinstance(area, (int, float)):
+        return float(area)
+        
+    # Пытаемся извлечь числовое значение и единицу измерения
+    match = _AREA_RE.search(area)
+    if match:
+        try:
+            area_value = float(match.group(1).replace(',', '.'))
+            
+            # Преобразуем гектары в м²
+            if match.group(2) in 'hH':
+                area_value *= 10000  # 1 га = 10,000 м²
+            
+            return area_value
+        except ValueError:
+            return None
+    return None
+
+@functools.lru_cache(maxsize=65536)
+def _get_location_key(location: str) -> str:
+    """
+    Нормализует местоположение для использования в статистике.
+    
+    Args:
+        location: Исходное местоположение
+        
+    Returns:
+        str: Нормализованное местоположение
+    """
+    if not location:
+        return "Unknown"
+        
+    # Нормализуем местоположение
+    location = location.strip().lower()
+    
+    # Извлекаем основной регион/город (обычно первая часть до запятой);
+    # остаток строки после первой запятой не разбираем
+    main_location = location.split(',', 1)[0].strip().title()
+    
+    # Разные исходные строки дают одинаковые ключи - храним один объект на ключ
+    return sys.intern(main_location)
+
+def _reduce_by_group(
+    values: np.ndarray,
+    group_ids: np.ndarray,
+    n_groups: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Считает количество, минимум, максимум и сумму значений по группам
+    за один проход по массиву, без сортировки.
+    
+    Args:
+        values: Значения
+        group_ids: Номер группы (от 0 до n_groups - 1) для каждого значения
+        n_groups: Количество групп
+        
+    Returns:
+        Tuple: Массивы количества, минимума, максимума и суммы по группам
+    """
+    counts = np.bincount(group_ids, minlength=n_groups)
+    totals = np.bincount(group_ids, weights=values, minlength=n_groups)
+    mins = np.full(n_groups, np.inf)
+    maxs = np.full(n_groups, -np.inf)
+    np.minimum.at(mins, group_ids, values)
+    np.maximum.at(maxs, group_ids, values)
+    return counts, mins, maxs, totals
+
 class ListingAnalytics:
     """
     Класс для сбора и анализа статистики по объявлениям о земельных участках.
     Отслеживает цены, местоположения и другие характеристики.
     """
     
-    def __init__(self, data_file: str = "data/analytics/listings_stats.json"):
+    def __init__(
+        self,
+        data_file: str = "data/analytics/listings_stats.json",
+        history_file: Optional[str] = None
+    ):
         """
         Инициализирует анализатор объявлений.
         
         Args:
             data_file: Путь к файлу данных для хранения статистики
+            history_file: Путь к CSV-файлу истории цен
+                (по умолчанию рядом с файлом статистики)
         """
         self.data_file = data_file
+        self.history_file = history_file or f"{os.path.splitext(data_file)[0]}_price_history.csv"
         self.stats = self._load_stats()
         self.current_batch = []
+        
+        # История цен раньше хранилась в файле статистики - переносим ее в CSV
+        legacy_history = self.stats.pop("price_history", None)
+        if legacy_history:
+            self._append_price_history(legacy_history)
+            self._save_stats()
+            logger.info(f"История цен перенесена в {self.history_file}")
     
     def _load_stats(self) -> Dict[str, Any]:
         """Загружает статистику из файла."""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(self.data_file, 'rb') as f:
+                    stats = orjson.loads(f.read())
+            else:
+                # Если файл не существует, создаем базовую структуру
+                stats = self._empty_stats()
             
-            # Если файл не существует, создаем базовую структуру
-            return {
-                "last_update": datetime.now().isoformat(),
-                "total_listings": 0,
-                "price_stats": {
-                    "min": None,
-                    "max": None,
-                    "median": None,
-                    "average": None,
-                    "by_location": {},
-                    "by_area": {},
-                    "by_period": {}
-                },
-                "location_stats": {
-                    "top_locations": [],
-                    "location_count": {}
-                },
-                "area_stats": {
-                    "min": None,
-                    "max": None,
-                    "median": None,
-                    "average": None
-                },
-                "source_stats": {},
-                "utilities_stats": {},
-                "price_history": []
-            }
+            # Счетчики держим в памяти как Counter, чтобы объединять их за один вызов
+            stats["location_stats"]["location_count"] = Counter(stats["location_stats"]["location_count"])
+            stats["source_stats"] = Counter(stats["source_stats"])
+            stats["utilities_stats"] = Counter(stats["utilities_stats"])
+            return stats
         except Exception as e:
             logger.error(f"Ошибка при загрузке статистики: {e}")
             return {}
     
+    def _empty_stats(self) -> Dict[str, Any]:
+        """Возвращает пустую структуру статистики."""
+        return {
+            "last_update": datetime.now().isoformat(),
+            "total_listings": 0,
+            "price_stats": {
+                "min": None,
+                "max": None,
+                "median": None,
+                "average": None,
+                "by_location": {},
+                "by_area": {},
+                "by_period": {}
+            },
+            "location_stats": {
+                "top_locations": [],
+                "location_count": {}
+            },
+            "area_stats": {
+                "min": None,
+                "max": None,
+                "median": None,
+                "average": None
+            },
+            "source_stats": {},
+            "utilities_stats": {}
+        }
+    
     def _save_stats(self):
         """Сохраняет статистику в файл."""
         try:
             os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.stats, f, ensure_ascii=False, indent=2, default=str)
+            with open(self.data_file, 'wb') as f:
+                f.write(orjson.dumps(self.stats, option=orjson.OPT_INDENT_2, default=str))
             logger.info(f"Статистика сохранена в {self.data_file}")
         except Exception as e:
             logger.error(f"Ошибка при сохранении статистики: {e}")
     
-    def _extract_price_number(self, price: str) -> Optional[float]:
-        """
-        Извлекает числовое значение цены из строки.
-        
-        Args:
-            price: Строка с ценой, например 'USD 50,000'
-            
-        Returns:
-            Optional[float]: Числовое значение цены или None, если не удалось извлечь
-        """
-        if not price:
-            return None
-            
-        # Пытаемся извлечь числовое значение с помощью регулярного выражения
-        match = re.search(r'[\d.,]+', price.replace(' ', ''))
-        if match:
-            price_str = match.group(0).replace(',', '.')
-            try:
-                # Заменяем все лишние точки, кроме последней
-                parts = price_str.split('.')
-                if len(parts) > 2:
-                    price_str = ''.join(parts[:-1]) + '.' + parts[-1]
-                return float(price_str)
-            except ValueError:
-                return None
-        return None
-    
-    def _extract_area_number(self, area: str) -> Optional[float]:
-        """
-        Извлекает числовое значение площади из строки.
-        
-        Args:
-            area: Строка с площадью, например '1000 m²' или '5 ha'
-            
-        Returns:
-            Optional[float]: Числовое значение площади в м² или None, если не удалось извлечь
-        """
-        if not area:
-            return None
-            
-        # Пытаемся извлечь числовое значение и единицу измерения
-        match = re.search(r'([\d.,]+)\s*([hm²²]|ha)', area.lower())
-        if match:
-            area_str = match.group(1).replace(',', '.')
-            unit = match.group(2)
-            
-            try:
-                area_value = float(area_str)
-                
-                # Преобразуем гектары в м²
-                if unit in ['h', 'ha']:
-                    area_value *= 10000  # 1 га = 10,000 м²
-                
-                return area_value
-            except ValueError:
-                return None
-        return None
-    
-    def _get_location_key(self, location: str) -> str:
+    def _append_price_history(self, rows: List[Dict[str, Any]]):
         """
-        Нормализует местоположение для использования в статистике.
+        Дописывает записи в CSV-файл истории цен. Заголовок пишется
+        при создании файла.
         
         Args:
-            location: Исходное местоположение
-            
-        Returns:
-            str: Нормализованное местоположение
+            rows: Записи истории с полями PRICE_HISTORY_FIELDS
         """
-        if not location:
-            return "Unknown"
-            
-        # Нормализуем местоположение
-        location = location.strip().lower()
-        
-        # Извлекаем основной регион/город (обычно первая часть до запятой)
-        parts = location.split(',')
-        main_location = parts[0].strip().title()
-        
-        return main_location
+        try:
+            os.makedirs(os.path.dirname(self.history_file) or ".", exist_ok=True)
+            write_header = not os.path.exists(self.history_file) or os.path.getsize(self.history_file) == 0
+            with open(self.history_file, 'a', newline='', encoding='utf-8', buffering=65536) as f:
+                writer = csv.writer(f)
+                if write_header:
+                    writer.writerow(PRICE_HISTORY_FIELDS)
+                writer.writerows([row.get(field) for field in PRICE_HISTORY_FIELDS] for row in rows)
+        except Exception as e:
+            logger.error(f"Ошибка при записи истории цен: {e}")
     
     def add_listing(self, listing: Listing):
         """
@@ -202,179 +268,214 @@ class ListingAnalytics:
         sources = []
         utilities = []
         
-        # Извлекаем данные из объявлений
+        price_stats = self.stats["price_stats"]
+        
+        # Цены с номерами групп (местоположение / диапазон площади) для
+        # последующей векторной агрегации; ключ группы -> номер группы
+        location_ids: Dict[str, int] = {}
+        location_group_ids = []
+        location_prices = []
+        area_range_ids: Dict[str, int] = {}
+        area_group_ids = []
+        area_prices = []
+        
+        # Извлекаем данные из объявлений за один проход
         for listing in self.current_batch:
             # Цена
-            price_value = self._extract_price_number(listing.price)
+            price_value = extract_price_number(listing.price)
             if price_value:
                 prices.append(price_value)
             
             # Площадь
-            area_value = self._extract_area_number(listing.area)
+            area_value = _extract_area_number(listing.area)
             if area_value:
                 areas.append(area_value)
             
             # Местоположение
+            location_key = None
             if listing.location:
-                location_key = self._get_location_key(listing.location)
+                location_key = _get_location_key(listing.location)
                 locations.append(location_key)
             
             # Источник
             if listing.source:
                 sources.append(listing.source)
             
-            # Коммуникации
-            if listing.utilities:
+            # Коммуникации: строка, если ее задал парсер (в модели Listing такого
+            # поля нет), иначе флаги has_water / has_electricity / has_internet
+            listing_utilities = getattr(listing, 'utilities', None)
+            if listing_utilities:
                 # Разбиваем строку коммуникаций на отдельные элементы
-                utils_list = [u.strip() for u in listing.utilities.split(',')]
-                utilities.extend(utils_list)
+                utilities.extend(_UTILITIES_SPLIT_RE.split(listing_utilities.strip()))
+            else:
+                utilities.extend(name for flag, name in _UTILITY_FLAGS if getattr(listing, flag, None))
+            
+            if price_value:
+                if location_key is not None:
+                    location_group_ids.append(location_ids.setdefault(location_key, len(location_ids)))
+                    location_prices.append(price_value)
+                if area_value:
+                    area_range = self._get_area_range(area_value)
+                    area_group_ids.append(area_range_ids.setdefault(area_range, len(area_range_ids)))
+                    area_prices.append(price_value)
+        
+        # Обновляем статистику цен по местоположению и размеру участка
+        self._merge_group_stats(price_stats["by_location"], list(location_ids), location_group_ids, location_prices)
+        self._merge_group_stats(price_stats["by_area"], list(area_range_ids), area_group_ids, area_prices)
         
         # Обновляем статистику цен
         if prices:
-            price_stats = self.stats["price_stats"]
+            # Все показатели пакета считаем один раз
+            prices_np = np.fromiter(prices, dtype=np.float64, count=len(prices))
+            batch_min = float(prices_np.min())
+            batch_max = float(prices_np.max())
+            batch_median = float(np.median(prices_np))
+            batch_average = float(prices_np.mean())
             
             # Обновляем минимальную и максимальную цену
-            if price_stats["min"] is None or min(prices) < price_stats["min"]:
-                price_stats["min"] = min(prices)
+            if price_stats["min"] is None or batch_min < price_stats["min"]:
+                price_stats["min"] = batch_min
             
-            if price_stats["max"] is None or max(prices) > price_stats["max"]:
-                price_stats["max"] = max(prices)
+            if price_stats["max"] is None or batch_max > price_stats["max"]:
+                price_stats["max"] = batch_max
             
-            # Обновляем среднюю и медиану
-            all_prices = prices  # TODO: добавить сохранение всех цен для более точного расчета
-            price_stats["median"] = statistics.median(all_prices)
-            price_stats["average"] = statistics.mean(all_prices)
+            # Средняя считается по всем объявлениям инкрементально,
+            # медиана - по текущему пакету (точная медиана требует всех цен)
+            price_stats["median"] = batch_median
+            self._update_running_mean(price_stats, prices_np, batch_average)
             
             # Добавляем текущие цены в историю
             current_date = datetime.now().strftime("%Y-%m-%d")
-            self.stats["price_history"].append({
+            self._append_price_history([{
                 "date": current_date,
                 "count": len(prices),
-                "min": min(prices),
-                "max": max(prices),
-                "median": statistics.median(prices),
-                "average": statistics.mean(prices)
-            })
-            
-            # Обновляем статистику цен по местоположению
-            for listing in self.current_batch:
-                price_value = self._extract_price_number(listing.price)
-                if price_value and listing.location:
-                    location_key = self._get_location_key(listing.location)
-                    
-                    if location_key not in price_stats["by_location"]:
-                        price_stats["by_location"][location_key] = {
-                            "count": 0,
-                            "min": None,
-                            "max": None,
-                            "total": 0
-                        }
-                    
-                    loc_stats = price_stats["by_location"][location_key]
-                    loc_stats["count"] += 1
-                    loc_stats["total"] += price_value
-                    
-                    if loc_stats["min"] is None or price_value < loc_stats["min"]:
-                        loc_stats["min"] = price_value
-                    
-                    if loc_stats["max"] is None or price_value > loc_stats["max"]:
-                        loc_stats["max"] = price_value
-                    
-                    # Обновляем среднюю цену
-                    loc_stats["average"] = loc_stats["total"] / loc_stats["count"]
-            
-            # Обновляем статистику цен по размеру участка
-            for listing in self.current_batch:
-                price_value = self._extract_price_number(listing.price)
-                area_value = self._extract_area_number(listing.area)
-                
-                if price_value and area_value:
-                    # Определяем диапазон площади
-                    area_range = self._get_area_range(area_value)
-                    
-                    if area_range not in price_stats["by_area"]:
-                        price_stats["by_area"][area_range] = {
-                            "count": 0,
-                            "min": None,
-                            "max": None,
-                            "total": 0
-                        }
-                    
-                    area_stats = price_stats["by_area"][area_range]
-                    area_stats["count"] += 1
-                    area_stats["total"] += price_value
-                    
-                    if area_stats["min"] is None or price_value < area_stats["min"]:
-                        area_stats["min"] = price_value
-                    
-                    if area_stats["max"] is None or price_value > area_stats["max"]:
-                        area_stats["max"] = price_value
-                    
-                    # Обновляем среднюю цену
-                    area_stats["average"] = area_stats["total"] / area_stats["count"]
+                "min": batch_min,
+                "max": batch_max,
+                "median": batch_median,
+                "average": batch_average
+            }])
         
         # Обновляем статистику площади
         if areas:
             area_stats = self.stats["area_stats"]
+            areas_np = np.fromiter(areas, dtype=np.float64, count=len(areas))
+            batch_min = float(areas_np.min())
+            batch_max = float(areas_np.max())
             
             # Обновляем минимальную и максимальную площадь
-            if area_stats["min"] is None or min(areas) < area_stats["min"]:
-                area_stats["min"] = min(areas)
+            if area_stats["min"] is None or batch_min < area_stats["min"]:
+                area_stats["min"] = batch_min
             
-            if area_stats["max"] is None or max(areas) > area_stats["max"]:
-                area_stats["max"] = max(areas)
+            if area_stats["max"] is None or batch_max > area_stats["max"]:
+                area_stats["max"] = batch_max
             
-            # Обновляем среднюю и медиану
-            area_stats["median"] = statistics.median(areas)
-            area_stats["average"] = statistics.mean(areas)
+            # Обновляем среднюю (по всем объявлениям) и медиану (по пакету)
+            area_stats["median"] = float(np.median(areas_np))
+            self._update_running_mean(area_stats, areas_np, float(areas_np.mean()))
         
         # Обновляем статистику местоположений
         if locations:
             location_stats = self.stats["location_stats"]
-            location_counter = Counter(locations)
             
             # Обновляем счетчик местоположений
-            for location, count in location_counter.items():
-                if location not in location_stats["location_count"]:
-                    location_stats["location_count"][location] = 0
-                
-                location_stats["location_count"][location] += count
+            location_stats["location_count"].update(locations)
             
-            # Обновляем топ местоположений
-            top_locations = sorted(
-                location_stats["location_count"].items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
-            location_stats["top_locations"] = top_locations[:10]
+            # Обновляем топ местоположений (частичная выборка через heapq, без полной сортировки)
+            location_stats["top_locations"] = location_stats["location_count"].most_common(10)
         
         # Обновляем статистику источников
         if sources:
-            source_counter = Counter(sources)
-            for source, count in source_counter.items():
-                if source not in self.stats["source_stats"]:
-                    self.stats["source_stats"][source] = 0
-                
-                self.stats["source_stats"][source] += count
+            self.stats["source_stats"].update(sources)
         
         # Обновляем статистику коммуникаций
         if utilities:
-            utility_counter = Counter(utilities)
-            for utility, count in utility_counter.items():
-                if utility not in self.stats["utilities_stats"]:
-                    self.stats["utilities_stats"][utility] = 0
-                
-                self.stats["utilities_stats"][utility] += count
+            self.stats["utilities_stats"].update(utilities)
         
         # Сохраняем обновленную статистику
         if save:
             self._save_stats()
         
         # Очищаем текущий пакет
-        self.current_batch = []
+        self.current_batch.clear()
         
         logger.info("Статистика успешно обновлена")
     
+    def _update_running_mean(self, stats: Dict[str, Any], values: np.ndarray, batch_mean: float):
+        """
+        Объединяет среднюю и дисперсию пакета с накопленными значениями
+        (параллельный вариант алгоритма Уэлфорда), не храня все значения.
+        
+        Args:
+            stats: Словарь статистики с полями count, average, m2
+            values: Значения текущего пакета
+            batch_mean: Среднее значение текущего пакета
+        """
+        count = stats.get("count") or 0
+        mean = stats.get("average") if count else 0.0
+        m2 = stats.get("m2") or 0.0
+        
+        batch_count = int(values.size)
+        batch_m2 = float(np.square(values - batch_mean).sum())
+        
+        total_count = count + batch_count
+        delta = batch_mean - mean
+        
+        stats["count"] = total_count
+        stats["average"] = mean + delta * batch_count / total_count
+        stats["m2"] = m2 + batch_m2 + delta * delta * count * batch_count / total_count
+        stats["variance"] = stats["m2"] / total_count
+    
+    def _merge_group_stats(
+        self,
+        group_stats: Dict[str, Any],
+        group_keys: List[str],
+        group_ids: List[int],
+        values: List[float]
+    ):
+        """
+        Добавляет цены пакета в статистику по группам (местоположениям или
+        диапазонам площади). Агрегаты всех групп считаются одним проходом
+        в _reduce_by_group, словарь статистики обновляется один раз на группу.
+        
+        Args:
+            group_stats: Словарь статистики по группам
+            group_keys: Ключи групп, индексируемые номером группы
+            group_ids: Номер группы для каждой цены
+            values: Цены объявлений
+        """
+        if not values:
+            return
+        
+        ids = np.fromiter(group_ids, dtype=np.intp, count=len(group_ids))
+        prices = np.fromiter(values, dtype=np.float64, count=len(values))
+        
+        # Номера групп плотные: каждая группа из group_keys встречается в пакете
+        counts, mins, maxs, totals = _reduce_by_group(prices, ids, len(group_keys))
+        
+        for key, count, group_min, group_max, total in zip(
+            group_keys, counts.tolist(), mins.tolist(), maxs.tolist(), totals.tolist()
+        ):
+            stats = group_stats.get(key)
+            if stats is None:
+                stats = group_stats[key] = {
+                    "count": 0,
+                    "min": None,
+                    "max": None,
+                    "total": 0
+                }
+            
+            stats["count"] += count
+            stats["total"] += total
+            
+            if stats["min"] is None or group_min < stats["min"]:
+                stats["min"] = group_min
+            
+            if stats["max"] is None or group_max > stats["max"]:
+                stats["max"] = group_max
+            
+            # Обновляем среднюю цену
+            stats["average"] = stats["total"] / stats["count"]
+    
     def _get_area_range(self, area_value: float) -> str:
         """
         Определяет диапазон площади для группировки статистики.
@@ -451,4 +552,22 @@ class ListingAnalytics:
         Returns:
             List[Dict[str, Any]]: История цен
         """
-        return self.stats.get("price_history", []) 
\ No newline at end of file
+        if not os.path.exists(self.history_file):
+            return []
+        
+        try:
+            with open(self.history_file, newline='', encoding='utf-8') as f:
+                return [
+                    {
+                        "date": row["date"],
+                        "count": int(row["count"]),
+                        "min": float(row["min"]),
+                        "max": float(row["max"]),
+                        "median": float(row["median"]),
+                        "average": float(row["average"])
+                    }
+                    for row in csv.DictReader(f)
+                ]
+        except Exception as e:
+            logger.error(f"Ошибка при чтении истории цен: {e}")
+            return [] 
\ No newline at end of file
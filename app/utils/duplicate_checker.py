@@ -4,15 +4,41 @@
 """
 
 import os
-import json
+import atexit
 import logging
-import hashlib
+import struct
+import time
+import weakref
+import orjson
+import xxhash
 from typing import List, Dict, Any, Optional, Set, Tuple
-from datetime import datetime, timedelta
+from datetime import datetime
 from app.models import Listing
+from app.utils.parsing import extract_price_number
 
 logger = logging.getLogger(__name__)
 
+# Стратегия -> seed 64-битного хеша ключа. Ключи всех стратегий хранятся
+# в одном кэше, разные seed разводят их между собой
+KEY_SEEDS = {
+    'url': 1,
+    'content_hash': 2,
+    'address_price': 3
+}
+
+# Запись журнала кэша: время (unix timestamp) и 64-битный ключ
+_LOG_RECORD = struct.Struct('<dQ')
+
+# Проверки с автосохранением. Слабые ссылки не удерживают экземпляры в памяти:
+# при завершении процесса сбрасываются только еще существующие
+_AUTO_SAVE_CHECKERS = weakref.WeakSet()
+
+@atexit.register
+def _flush_auto_save_checkers() -> None:
+    """Сбросить несохраненные изменения всех проверок при завершении процесса"""
+    for checker in list(_AUTO_SAVE_CHECKERS):
+        checker.flush()
+
 class DuplicateChecker:
     """
     Класс для проверки дубликатов объявлений с различными стратегиями.
@@ -24,7 +50,8 @@ class DuplicateChecker:
         cache_file: str = "cache/listings_cache.json",
         max_age_days: int = 30,
         auto_save: bool = True,
-        strategies: List[str] = None
+        strategies: List[str] = None,
+        flush_threshold: int = 1000
     ):
         """
         Инициализация проверки дубликатов.
@@ -33,6 +60,8 @@ class DuplicateChecker:
             cache_file: Путь к файлу для хранения кэша объявлений
             max_age_days: Максимальный возраст записей в кэше (в днях)
             auto_save: Автоматически сохранять кэш при добавлении новых записей
+            flush_threshold: Минимальное число записей в журнале, после которого
+                он сворачивается в снимок кэша
             strategies: Список стратегий проверки дубликатов
                 Доступные стратегии: 'url', 'content_hash', 'address_price'
         """
@@ -43,17 +72,25 @@ class DuplicateChecker:
         # Устанавливаем стратегии проверки дубликатов
         self.strategies = strategies or ['url', 'content_hash']
         
-        # Словари для хранения кэша по разным стратегиям
-        self.url_cache: Set[str] = set()
-        self.content_hash_cache: Set[str] = set()
-        self.address_price_cache: Set[str] = set()
+        # Общий кэш всех стратегий: 64-битный ключ -> время
+        # последнего обнаружения (unix timestamp)
+        self._cache: Dict[int, float] = {}
         
-        # Словарь дата-время последнего обновления для каждого элемента
-        self.last_seen: Dict[str, datetime] = {}
+        # Изменения дописываются в журнал рядом со снимком кэша; когда журнал
+        # вырастает больше двух снимков, он сворачивается в новый снимок
+        self.log_file = f"{cache_file}.log"
+        self._log = None
+        self._log_entries = 0
+        self._snapshot_size = 0
+        self._flush_threshold = flush_threshold
         
         # Загружаем кэш при инициализации
         self._ensure_cache_dir()
         self.load_cache()
+        
+        # Несохраненные изменения записываются при завершении процесса
+        if self.auto_save:
+            _AUTO_SAVE_CHECKERS.add(self)
     
     def _ensure_cache_dir(self) -> None:
         """Убедиться, что директория для кэша существует"""
@@ -63,65 +100,123 @@ class DuplicateChecker:
             logger.info(f"Создана директория для кэша: {cache_dir}")
     
     def load_cache(self) -> None:
-        """Загрузить кэш из файла"""
-        if not os.path.exists(self.cache_file):
+        """Загрузить кэш из снимка и журнала изменений"""
+        if not os.path.exists(self.cache_file) and not os.path.exists(self.log_file):
             logger.info(f"Файл кэша не найден: {self.cache_file}. Будет создан новый.")
             return
         
         try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
-                
-                self.url_cache = set(cache_data.get('url_cache', []))
-                self.content_hash_cache = set(cache_data.get('content_hash_cache', []))
-                self.address_price_cache = set(cache_data.get('address_price_cache', []))
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'rb') as f:
+                    cache_data = orjson.loads(f.read())
                 
-                # Преобразуем строки с датами в объекты datetime
-                self.last_seen = {
-                    k: datetime.fromisoformat(v) 
-                    for k, v in cache_data.get('last_seen', {}).items()
-                }
+                if 'keys' in cache_data:
+                    self._cache = dict(zip(cache_data['keys'], cache_data['seen']))
+                    self._replay_log()
+                else:
+                    self._cache = self._convert_legacy_cache(cache_data)
+                    # Журнал старого формата несовместим с новыми записями: сразу
+                    # сохраняем снимок в новом формате, что удаляет и журнал.
+                    # Дальнейшие загрузки читают журнал как обычно
+                    self.save_cache()
+                self._snapshot_size = len(self._cache)
+            else:
+                self._replay_log()
                 
-            logger.info(f"Загружен кэш: {len(self.url_cache)} URL, "
-                      f"{len(self.content_hash_cache)} хешей содержимого")
+            logger.info(f"Загружен кэш: {len(self._cache)} записей")
             
             # Очищаем устаревшие записи при загрузке
             self.cleanup_old_entries()
         except Exception as e:
             logger.error(f"Ошибка загрузки кэша: {e}")
             # Инициализируем пустой кэш при ошибке
-            self.url_cache = set()
-            self.content_hash_cache = set()
-            self.address_price_cache = set()
-            self.last_seen = {}
+            self._cache = {}
+    
+    def _convert_legacy_cache(self, cache_data: Dict[str, Any]) -> Dict[int, float]:
+        """
+        Преобразовать кэш старого формата со строковыми ключами. Переносятся
+        только URL: хеши содержимого и адреса считались другим алгоритмом.
+        """
+        now = time.time()
+        cache = {}
+        
+        # Старый формат: отдельные списки по стратегиям и last_seen
+        last_seen = cache_data.get('last_seen', {})
+        for url in cache_data.get('url_cache', []):
+            seen = last_seen.get(url)
+            cache[self.generate_url_key(url)] = datetime.fromisoformat(seen).timestamp() if seen else now
+        
+        return cache
+    
+    def _replay_log(self) -> None:
+        """Применить к кэшу записи журнала изменений"""
+        if not os.path.exists(self.log_file):
+            return
+        
+        with open(self.log_file, 'rb') as f:
+            data = f.read()
+        
+        cache = self._cache
+        # Последняя запись может быть оборвана (процесс прерван во время записи)
+        entries = len(data) // _LOG_RECORD.size
+        for timestamp, key in _LOG_RECORD.iter_unpack(data[:entries * _LOG_RECORD.size]):
+            cache[key] = timestamp
+        
+        self._log_entries = entries
+        logger.debug(f"Применено {entries} записей журнала кэша")
+    
+    def _append_log(self, key: int, timestamp: float) -> None:
+        """Дописать запись в журнал изменений кэша"""
+        if self._log is None:
+            self._log = open(self.log_file, 'ab', buffering=65536)
+        
+        self._log.write(_LOG_RECORD.pack(timestamp, key))
+        self._log_entries += 1
+    
+    def _close_log(self) -> None:
+        """Закрыть файл журнала изменений"""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
     
     def save_cache(self) -> None:
-        """Сохранить кэш в файл"""
+        """Сохранить снимок кэша в файл и очистить журнал изменений"""
         try:
-            cache_data = {
-                'url_cache': list(self.url_cache),
-                'content_hash_cache': list(self.content_hash_cache),
-                'address_price_cache': list(self.address_price_cache),
-                'last_seen': {k: v.isoformat() for k, v in self.last_seen.items()}
-            }
+            # Пишем во временный файл и атомарно подменяем, чтобы не оставить обрезанный кэш
+            tmp_file = f"{self.cache_file}.tmp"
+            with open(tmp_file, 'wb', buffering=65536) as f:
+                f.write(orjson.dumps({
+                    'keys': list(self._cache),
+                    'seen': list(self._cache.values())
+                }))
+            os.replace(tmp_file, self.cache_file)
             
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            # Все изменения из журнала вошли в снимок
+            self._close_log()
+            if os.path.exists(self.log_file):
+                os.remove(self.log_file)
+            self._log_entries = 0
+            self._snapshot_size = len(self._cache)
                 
-            logger.debug(f"Кэш сохранен: {len(self.url_cache)} URL, "
-                       f"{len(self.content_hash_cache)} хешей содержимого")
+            logger.debug(f"Кэш сохранен: {len(self._cache)} записей")
         except Exception as e:
             logger.error(f"Ошибка сохранения кэша: {e}")
     
+    def flush(self) -> None:
+        """Сбросить журнал изменений на диск, при необходимости свернув его в снимок"""
+        if self._log_entries > max(2 * self._snapshot_size, self._flush_threshold):
+            self.save_cache()
+        elif self._log is not None:
+            self._log.flush()
+    
     def cleanup_old_entries(self) -> None:
         """Удалить устаревшие записи из кэша"""
         if self.max_age_days <= 0:
             return
         
-        now = datetime.now()
-        cutoff_date = now - timedelta(days=self.max_age_days)
+        cutoff = time.time() - self.max_age_days * 86400
         
-        old_entries = [k for k, v in self.last_seen.items() if v < cutoff_date]
+        old_entries = [k for k, seen in self._cache.items() if seen < cutoff]
         
         if not old_entries:
             return
@@ -129,17 +224,16 @@ class DuplicateChecker:
         logger.info(f"Удаление {len(old_entries)} устаревших записей из кэша")
         
         for key in old_entries:
-            self.last_seen.pop(key, None)
-            
-            # Удаляем из всех кэшей по возможности
-            self.url_cache.discard(key)
-            self.content_hash_cache.discard(key)
-            self.address_price_cache.discard(key)
+            del self._cache[key]
         
         if self.auto_save:
             self.save_cache()
     
-    def generate_content_hash(self, listing: Listing) -> str:
+    def generate_url_key(self, url: str) -> int:
+        """Генерирует ключ кэша для URL объявления"""
+        return xxhash.xxh3_64_intdigest(str(url).encode('utf-8'), seed=KEY_SEEDS['url'])
+    
+    def generate_content_hash(self, listing: Listing) -> int:
         """
         Генерирует хеш содержимого объявления,
         используя наиболее релевантные поля
@@ -160,32 +254,44 @@ class DuplicateChecker:
             # Используем первые 200 символов описания для уменьшения влияния форматирования
             content_parts.append(str(listing.description)[:200])
         
-        # Соединяем части для создания хеша
-        content_string = "||".join([p.strip().lower() for p in content_parts if p])
+        # Подаем части в хеш по очереди (с разделителем "||"), не собирая общую строку.
+        # Криптостойкость здесь не нужна, поэтому используется быстрый 64-битный xxh3
+        hasher = xxhash.xxh3_64(seed=KEY_SEEDS['content_hash'])
+        separator = b""
+        for part in content_parts:
+            if part:
+                hasher.update(separator)
+                hasher.update(part.strip().lower().encode('utf-8'))
+                separator = b"||"
         
-        # Генерируем хеш
-        return hashlib.md5(content_string.encode('utf-8')).hexdigest()
+        return hasher.intdigest()
     
-    def generate_address_price_key(self, listing: Listing) -> Optional[str]:
+    def generate_address_price_key(self, listing: Listing) -> Optional[int]:
         """
         Генерирует ключ на основе адреса и цены для сравнения объявлений.
         Возвращает None, если недостаточно данных.
         """
-        if not listing.location or not listing.price:
+        if not listing.location:
+            return None
+        
+        price_value = extract_price_number(listing.price)
+        if not price_value:
             return None
         
         # Очищаем адрес от ненужных деталей
         address = listing.location.strip().lower()
         
-        # Включаем цену с округлением до сотен для допуска небольших отклонений
-        price_rounded = round(int(listing.price) / 100) * 100
+        # Включаем цену, приведенную к сотням, для допуска небольших отклонений
+        price_bucket = int(price_value) // 100 * 100
         
-        key = f"{address}||{price_rounded}"
-        return hashlib.md5(key.encode('utf-8')).hexdigest()
+        key = f"{address}||{price_bucket}"
+        return xxhash.xxh3_64_intdigest(key.encode('utf-8'), seed=KEY_SEEDS['address_price'])
     
     def is_duplicate(self, listing: Listing) -> bool:
         """
         Проверяет, является ли объявление дубликатом по выбранным стратегиям.
+        Стратегии проверяются от дешевых к дорогим, каждый ключ вычисляется один раз
+        и переиспользуется при добавлении объявления в кэш.
         
         Args:
             listing: Объект объявления для проверки
@@ -193,69 +299,86 @@ class DuplicateChecker:
         Returns:
             bool: True, если объявление является дубликатом, иначе False
         """
-        # Проверка по URL
-        if 'url' in self.strategies and listing.url in self.url_cache:
-            logger.debug(f"Дубликат по URL: {listing.url}")
-            self._update_last_seen(listing.url)
-            return True
+        now = time.time()
+        keys = []
         
-        # Проверка по хешу содержимого
-        if 'content_hash' in self.strategies:
-            content_hash = self.generate_content_hash(listing)
-            listing.content_hash = content_hash  # Сохраняем хеш в объекте для возможного использования
-            
-            if content_hash in self.content_hash_cache:
-                logger.debug(f"Дубликат по хешу содержимого: {content_hash}")
-                self._update_last_seen(content_hash)
+        # Проверка по URL
+        if 'url' in self.strategies and listing.url:
+            key = self.generate_url_key(listing.url)
+            if key in self._cache:
+                logger.debug(f"Дубликат по URL: {listing.url}")
+                self._touch(key, now)
                 return True
+            keys.append(key)
         
         # Проверка по адресу и цене
         if 'address_price' in self.strategies:
             address_price_key = self.generate_address_price_key(listing)
             
-            if address_price_key and address_price_key in self.address_price_cache:
-                logger.debug(f"Дубликат по адресу и цене: {listing.location}, {listing.price}")
-                self._update_last_seen(address_price_key)
+            if address_price_key is not None:
+                if address_price_key in self._cache:
+                    logger.debug(f"Дубликат по адресу и цене: {listing.location}, {listing.price}")
+                    self._touch(address_price_key, now)
+                    return True
+                keys.append(address_price_key)
+        
+        # Проверка по хешу содержимого
+        if 'content_hash' in self.strategies:
+            content_hash = self.generate_content_hash(listing)
+            listing.content_hash = f"{content_hash:016x}"  # Сохраняем хеш в объекте для возможного использования
+            
+            if content_hash in self._cache:
+                logger.debug(f"Дубликат по хешу содержимого: {listing.content_hash}")
+                self._touch(content_hash, now)
                 return True
+            keys.append(content_hash)
         
-        # Если не найден дубликат, добавляем в кэш
-        self.add_to_cache(listing)
+        # Если не найден дубликат, добавляем в кэш уже вычисленные ключи
+        self._add_keys(keys, now)
         return False
     
-    def _update_last_seen(self, key: str) -> None:
+    def _touch(self, key: int, now: float) -> None:
         """Обновляет временную метку последнего обнаружения для ключа"""
-        self.last_seen[key] = datetime.now()
+        self._cache[key] = now
+        if self.auto_save:
+            self._append_log(key, now)
     
-    def add_to_cache(self, listing: Listing) -> None:
-        """
-        Добавляет объявление в кэш по всем активным стратегиям
+    def _listing_keys(self, listing: Listing) -> List[int]:
+        """Возвращает ключи кэша объявления по всем активным стратегиям"""
+        keys = []
         
-        Args:
-            listing: Объект объявления для добавления в кэш
-        """
-        now = datetime.now()
-        
-        # Добавляем URL в кэш
         if 'url' in self.strategies and listing.url:
-            self.url_cache.add(listing.url)
-            self.last_seen[listing.url] = now
+            keys.append(self.generate_url_key(listing.url))
         
-        # Добавляем хеш содержимого в кэш
-        if 'content_hash' in self.strategies:
-            content_hash = listing.content_hash or self.generate_content_hash(listing)
-            self.content_hash_cache.add(content_hash)
-            self.last_seen[content_hash] = now
-        
-        # Добавляем ключ адрес+цена в кэш
         if 'address_price' in self.strategies:
             address_price_key = self.generate_address_price_key(listing)
-            if address_price_key:
-                self.address_price_cache.add(address_price_key)
-                self.last_seen[address_price_key] = now
+            if address_price_key is not None:
+                keys.append(address_price_key)
         
-        if self.auto_save:
+        if 'content_hash' in self.strategies:
+            content_hash = self.generate_content_hash(listing)
+            listing.content_hash = f"{content_hash:016x}"
+            keys.append(content_hash)
+        
+        return keys
+    
+    def _add_keys(self, keys: List[int], now: float) -> None:
+        """Добавляет ключи в кэш и при необходимости сворачивает журнал в снимок"""
+        for key in keys:
+            self._touch(key, now)
+        
+        if self.auto_save and self._log_entries > max(2 * self._snapshot_size, self._flush_threshold):
             self.save_cache()
     
+    def add_to_cache(self, listing: Listing) -> None:
+        """
+        Добавляет объявление в кэш по всем активным стратегиям
+        
+        Args:
+            listing: Объект объявления для добавления в кэш
+        """
+        self._add_keys(self._listing_keys(listing), time.time())
+    
     def filter_duplicates(self, listings: List[Listing]) -> List[Listing]:
         """
         Фильтрует список объявлений, удаляя дубликаты
@@ -266,14 +389,33 @@ class DuplicateChecker:
         Returns:
             List[Listing]: Список уникальных объявлений
         """
+        now = time.time()
+        listings_keys = [self._listing_keys(listing) for listing in listings]
+        
+        # Ключи пакета, уже известные кэшу, находятся одной операцией над множествами;
+        # дальше в него же добавляются ключи принятых объявлений, что отсекает
+        # повторы внутри самого пакета
+        known = self._cache.keys() & {key for keys in listings_keys for key in keys}
+        
         unique_listings = []
+        batch_keys = []
         duplicates_count = 0
         
-        for listing in listings:
-            if not self.is_duplicate(listing):
+        for listing, keys in zip(listings, listings_keys):
+            hit = next((key for key in keys if key in known), None)
+            if hit is None:
                 unique_listings.append(listing)
+                known.update(keys)
+                batch_keys.extend(keys)
             else:
                 duplicates_count += 1
+                batch_keys.append(hit)
+        
+        # Кэш и журнал обновляются одним проходом для всего пакета
+        self._add_keys(batch_keys, now)
+        
+        if self.auto_save:
+            self.flush()
         
         if duplicates_count > 0:
             logger.info(f"Отфильтровано {duplicates_count} дубликатов из {len(listings)} объявлений")
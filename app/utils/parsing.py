@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Общие функции разбора полей объявлений.
+"""
+
+import functools
+import re
+from typing import Optional, Union
+
+# Шаблон для извлечения числа из строки цены
+_PRICE_RE = re.compile(r'[\d.,]+')
+
+@functools.lru_cache(maxsize=65536)
+def extract_price_number(price: Union[str, int, float, None]) -> Optional[float]:
+    """
+    Извлекает числовое значение цены из строки или числа.
+    Результат кэшируется: одни и те же строки цены повторяются от объявления к объявлению.
+    
+    Args:
+        price: Цена, например 'USD 50,000' или 50000
+        
+    Returns:
+        Optional[float]: Числовое значение цены или None, если не удалось извлечь
+    """
+    if not price:
+        return None
+    
+    # Цена уже может быть числом (поле price модели Listing)
+    if isinstance(price, (int, float)):
+        return float(price)
+        
+    # Пытаемся извлечь числовое значение с помощью регулярного выражения
+    match = _PRICE_RE.search(price.replace(' ', ''))
+    if match:
+        # Последний разделитель считаем десятичным, остальные отбрасываем
+        head, sep, tail = match.group(0).replace(',', '.').rpartition('.')
+        try:
+            return float(f"{head.replace('.', '')}.{tail}" if sep else tail)
+        except ValueError:
+            return None
+    return None
@@ -12,27 +12,163 @@ import argparse
 from datetime import datetime, timedelta
 from pathlib import Path
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(f"logs/scheduler_{datetime.now().strftime('%Y%m%d')}.log", mode='a')
-    ]
-)
-
 logger = logging.getLogger("scheduler")
 
-# Импортируем парсеры
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.parsers.mercadolibre import MercadoLibreParser
-from app.parsers.infocasas import InfoCasasParser
-from app.telegram_sender import send_listings_to_telegram
+# Путь к скрипту и его директория (для команд cron и файла .env)
+_SCRIPT_PATH = Path(__file__).resolve()
+_SCRIPT_DIR = _SCRIPT_PATH.parent
+
+def configure_logging():
+    """
+    Настраивает логирование в консоль и файл logs/scheduler_YYYYMMDD.log.
+    Вызывается только для запуска парсеров; файл открывается при первой записи.
+    """
+    Path("logs").mkdir(exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler(f"logs/scheduler_{datetime.now():%Y%m%d}.log", mode='a', delay=True)
+        ]
+    )
+
+# Добавляем родительскую директорию в путь поиска модулей
+sys.path.append(str(_SCRIPT_DIR.parent))
 
 # Конфигурация расписания
 DAYTIME_HOURS = [8, 12, 16, 20]  # Запуск в 8:00, 12:00, 16:00, 20:00
 NIGHTTIME_HOUR = 2               # Ночной запуск в 2:00
+PARSER_TIMEOUT = 25 * 60         # Максимальное время работы одного парсера (в секундах)
+TELEGRAM_COALESCE_SECONDS = 5    # Ожидание результатов других парсеров перед отправкой в Telegram
+
+# Шаблон записи объявления в файле результатов
+_LISTING_TMPL = (
+    "Объявление {n}:\n"
+    "  URL: {url}\n"
+    "  Заголовок: {title}\n"
+    "  Цена: {price}\n"
+    "  Расположение: {location}\n"
+    "  Площадь: {area}\n"
+    "  Дата обнаружения: {date_scraped}\n"
+    "{description}"
+    "  Новое: {is_recent}\n"
+    "\n"
+)
+
+# Директории для результатов и логов; созданные запоминаются, чтобы не проверять их повторно
+REQUIRED_DIRS = ("logs", "data", "errors", "images")
+_READY_DIRS = set()
+
+def ensure_dirs():
+    """Создает рабочие директории, которые еще не были созданы в этом процессе."""
+    for directory in REQUIRED_DIRS:
+        if directory in _READY_DIRS:
+            continue
+        Path(directory).mkdir(exist_ok=True)
+        _READY_DIRS.add(directory)
+
+async def run_parser(source, parser, max_pages, headless, run_ts=None, timeout=PARSER_TIMEOUT, send_queue=None):
+    """
+    Запускает один парсер со сбором деталей объявлений, сохраняет результаты
+    и закрывает парсер. Зависший парсер прерывается по таймауту и не задерживает остальные.
+    
+    Args:
+        source: Название источника (mercadolibre, infocasas)
+        parser: Экземпляр парсера
+        max_pages: Максимальное количество страниц
+        headless: Запускать браузер в фоновом режиме
+        run_ts: Время запуска парсеров для имени файла результатов
+        timeout: Максимальное время работы парсера в секундах
+        send_queue: Очередь отправки в Telegram; результаты ставятся в нее сразу после сохранения
+        
+    Returns:
+        tuple: (source, listings)
+    """
+    try:
+        logger.info(f"Запуск парсера {source}")
+        try:
+            listings = await asyncio.wait_for(
+                parser.run_with_details(max_pages=max_pages, headless=headless),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"{source}: превышено время работы парсера ({timeout} с)")
+            return source, []
+        logger.info(f"{source}: получено {len(listings)} объявлений")
+        
+        # Сохраняем результаты в отдельном потоке, не блокируя цикл событий
+        await asyncio.to_thread(save_results, source, listings, run_ts)
+        
+        if send_queue is not None and listings:
+            await send_queue.put(listings)
+        return source, listings
+    finally:
+        # Закрываем парсер сразу по завершении, не дожидаясь остальных
+        try:
+            await parser.close()
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии парсера {source}: {e}")
+
+async def send_to_telegram_worker(send_queue):
+    """
+    Отправляет в Telegram результаты парсеров по мере их готовности.
+    Результаты, пришедшие почти одновременно, объединяются в одну отправку.
+    Очередь завершается значением None.
+    
+    Args:
+        send_queue: Очередь списков объявлений
+    """
+    # Отправка в Telegram тянет за собой HTTP-клиенты, поэтому импортируется
+    # здесь, а не при загрузке модуля (не нужна для --setup/--setup-env)
+    from app.telegram_sender import TelegramSender
+    
+    # URL уже отправленных объявлений: одно и то же объявление может быть
+    # опубликовано на обоих сайтах
+    seen_urls = set()
+    done = False
+    
+    # Один отправитель на весь запуск: общая HTTP-сессия и журнал отправленных
+    async with TelegramSender(
+        bot_token=os.getenv("TELEGRAM_BOT_TOKEN"),
+        chat_id=os.getenv("TELEGRAM_CHAT_ID")
+    ) as sender:
+        while not done:
+            item = await send_queue.get()
+            if item is None:
+                break
+            batch = list(item)
+            
+            # Даем другим парсерам немного времени, чтобы отправить результаты вместе
+            while True:
+                try:
+                    item = await asyncio.wait_for(send_queue.get(), timeout=TELEGRAM_COALESCE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.extend(item)
+            
+            # Оставляем первое вхождение каждого URL, сохраняя порядок
+            listings = []
+            for listing in batch:
+                url = str(listing.url)
+                if url not in seen_urls:
+                    seen_urls.add(url)
+                    listings.append(listing)
+            if len(listings) < len(batch):
+                logger.info(f"Удалено {len(batch) - len(listings)} повторяющихся объявлений")
+            if not listings:
+                continue
+            
+            logger.info(f"Отправка {len(listings)} объявлений в Telegram")
+            try:
+                # Уже отправленные ранее объявления TelegramSender пропускает сам
+                sent_count, skipped_count = await sender.send_listings(listings, delay=3.0)
+                logger.info(f"Отправлено в Telegram: {sent_count}, пропущено {skipped_count}")
+            except Exception as e:
+                logger.error(f"Ошибка при отправке в Telegram: {e}")
 
 async def run_parsers(is_nighttime=False, send_to_telegram=True):
     """
@@ -42,105 +178,103 @@ async def run_parsers(is_nighttime=False, send_to_telegram=True):
         is_nighttime: True, если запуск происходит ночью
         send_to_telegram: Отправлять результаты в Telegram
     """
+    # Парсеры тянут за собой Playwright, поэтому импортируются только при
+    # запуске парсеров (не для --setup/--setup-env)
+    from app.parsers.mercadolibre import MercadoLibreParser
+    from app.parsers.infocasas import InfoCasasParser
+    
     # Создаем директории для хранения результатов и логов
-    os.makedirs("logs", exist_ok=True)
-    os.makedirs("data", exist_ok=True)
-    os.makedirs("errors", exist_ok=True)
-    os.makedirs("images", exist_ok=True)
+    ensure_dirs()
     
     # Определяем параметры в зависимости от времени суток
     max_pages = 3 if is_nighttime else 2
     headless = True  # В боевом режиме запускаем в фоне
     
-    # Записываем время запуска
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    logger.info(f"Запуск парсеров {timestamp} ({'ночь' if is_nighttime else 'день'})")
+    # Записываем время запуска (используется и в именах файлов результатов)
+    run_ts = datetime.now()
+    logger.info(f"Запуск парсеров {run_ts:%Y-%m-%d %H:%M:%S} ({'ночь' if is_nighttime else 'день'})")
     
     # Создаем экземпляры парсеров
     ml_parser = MercadoLibreParser(headless_mode=headless)
     ic_parser = InfoCasasParser(headless_mode=headless)
     
-    all_listings = []
+    # Результаты каждого парсера отправляются в Telegram, как только он завершится
+    send_queue = None
+    sender_task = None
+    if send_to_telegram:
+        # Проверяем наличие переменных окружения для Telegram
+        if not os.getenv("TELEGRAM_BOT_TOKEN") or not os.getenv("TELEGRAM_CHAT_ID"):
+            logger.warning("Не настроены переменные окружения для Telegram. Проверьте TELEGRAM_BOT_TOKEN и TELEGRAM_CHAT_ID")
+        else:
+            send_queue = asyncio.Queue()
+            sender_task = asyncio.create_task(send_to_telegram_worker(send_queue))
     
     try:
-        # Запускаем парсер MercadoLibre
-        logger.info("Запуск MercadoLibre парсера")
-        ml_listings = await ml_parser.run_with_details(max_pages=max_pages, headless=headless)
-        logger.info(f"MercadoLibre: получено {len(ml_listings)} объявлений")
+        # Запускаем парсеры параллельно: оба ждут сеть и браузер, а не процессор.
+        # Ошибка одного парсера не прерывает другой
+        results = await asyncio.gather(
+            run_parser("mercadolibre", ml_parser, max_pages, headless, run_ts, send_queue=send_queue),
+            run_parser("infocasas", ic_parser, max_pages, headless, run_ts, send_queue=send_queue),
+            return_exceptions=True
+        )
         
-        # Сохраняем результаты
-        save_results("mercadolibre", ml_listings)
-        all_listings.extend(ml_listings)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при работе парсера: {result}")
         
-        # Запускаем парсер InfoCasas
-        logger.info("Запуск InfoCasas парсера")
-        ic_listings = await ic_parser.run_with_details(max_pages=max_pages, headless=headless)
-        logger.info(f"InfoCasas: получено {len(ic_listings)} объявлений")
-        
-        # Сохраняем результаты
-        save_results("infocasas", ic_listings)
-        all_listings.extend(ic_listings)
-        
-        # Отправляем объявления в Telegram
-        if send_to_telegram and all_listings:
-            logger.info("Отправка объявлений в Telegram")
-            
-            # Проверяем наличие переменных окружения для Telegram
-            if not os.getenv("TELEGRAM_BOT_TOKEN") or not os.getenv("TELEGRAM_CHAT_ID"):
-                logger.warning("Не настроены переменные окружения для Telegram. Проверьте TELEGRAM_BOT_TOKEN и TELEGRAM_CHAT_ID")
-            else:
-                # Отправляем только новые объявления (за последние 12 часов)
-                results = await send_listings_to_telegram(all_listings, only_recent=True)
-                
-                # Логируем результаты отправки
-                if "error" in results:
-                    logger.error(f"Ошибка при отправке в Telegram: {results['error']}")
-                else:
-                    for source, stats in results.items():
-                        if isinstance(stats, dict):
-                            logger.info(f"Отправлено в Telegram ({source}): {stats.get('sent', 0)} из {stats.get('total', 0)}")
+        # Дожидаемся отправки всех результатов
+        if sender_task is not None:
+            await send_queue.put(None)
+            await sender_task
         
     except Exception as e:
         logger.error(f"Ошибка при запуске парсеров: {e}")
     
     finally:
-        # Закрываем ресурсы
-        await ml_parser.close()
-        await ic_parser.close()
+        # Парсеры закрываются в run_parser
+        if sender_task is not None and not sender_task.done():
+            sender_task.cancel()
         logger.info("Работа планировщика завершена")
 
-def save_results(source, listings):
+def save_results(source, listings, run_ts=None):
     """
     Сохраняет результаты в файл.
     
     Args:
         source: Название источника (mercadolibre, infocasas)
         listings: Список объявлений
+        run_ts: Время запуска парсеров; файлы одного запуска получают одинаковую метку
     """
     if not listings:
         logger.warning(f"Нет объявлений для сохранения из {source}")
         return
     
-    filename = f"data/{source}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    filename = f"data/{source}_{run_ts or datetime.now():%Y%m%d_%H%M%S}.txt"
     try:
-        with open(filename, "w", encoding="utf-8") as f:
-            for i, listing in enumerate(listings):
-                f.write(f"Объявление {i+1}:\n")
-                f.write(f"  URL: {listing.url}\n")
-                f.write(f"  Заголовок: {listing.title}\n")
-                f.write(f"  Цена: {listing.price}\n")
-                f.write(f"  Расположение: {listing.location}\n")
-                f.write(f"  Площадь: {listing.area}\n")
-                f.write(f"  Дата обнаружения: {listing.date_scraped}\n")
-                if listing.description:
-                    f.write(f"  Описание: {listing.description[:200]}...\n")
-                
-                # Отмечаем, является ли объявление новым (за последние 12 часов)
-                is_recent = False
-                if hasattr(listing, 'attributes') and listing.attributes:
-                    is_recent = listing.attributes.get('is_recent', False)
-                f.write(f"  Новое: {'Да' if is_recent else 'Нет'}\n")
-                f.write("\n")
+        # Отмечаем, является ли объявление новым (за последние 12 часов).
+        # Модель Listing не имеет поля attributes, поэтому оно читается через getattr
+        recent_flags = [
+            (getattr(listing, 'attributes', None) or {}).get('is_recent', False)
+            for listing in listings
+        ]
+        
+        # Собираем содержимое файла в памяти и записываем одним вызовом
+        parts = []
+        for i, (listing, is_recent) in enumerate(zip(listings, recent_flags), 1):
+            parts.append(_LISTING_TMPL.format_map({
+                'n': i,
+                'url': listing.url,
+                'title': listing.title,
+                'price': listing.price,
+                'location': listing.location,
+                'area': listing.area,
+                'date_scraped': listing.crawled_at,
+                'description': f"  Описание: {listing.description[:200]}...\n" if listing.description else "",
+                'is_recent': 'Да' if is_recent else 'Нет'
+            }))
+        
+        with open(filename, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.write("".join(parts))
         logger.info(f"Результаты {source} сохранены в {filename}")
     except Exception as e:
         logger.error(f"Ошибка при сохранении результатов {source}: {e}")
@@ -150,17 +284,16 @@ def setup_cron():
     Настраивает cron-задачи для автоматического запуска парсеров.
     Выводит команды, которые нужно добавить в crontab.
     """
-    script_path = os.path.abspath(__file__)
     print("\nДля настройки cron выполните следующие шаги:")
     print("1. Запустите редактор crontab командой: crontab -e")
     print("2. Добавьте следующие строки:\n")
     
     # Дневные запуски (каждые 4 часа)
     for hour in DAYTIME_HOURS:
-        print(f"0 {hour} * * * cd {os.path.dirname(script_path)} && python3 {script_path} --daytime")
+        print(f"0 {hour} * * * cd {_SCRIPT_DIR} && python3 {_SCRIPT_PATH} --daytime")
     
     # Ночной запуск (1 раз)
-    print(f"0 {NIGHTTIME_HOUR} * * * cd {os.path.dirname(script_path)} && python3 {script_path} --nighttime")
+    print(f"0 {NIGHTTIME_HOUR} * * * cd {_SCRIPT_DIR} && python3 {_SCRIPT_PATH} --nighttime")
     
     print("\n3. Сохраните файл и закройте редактор.")
     print("4. Проверьте настройки командой: crontab -l\n")
@@ -174,7 +307,7 @@ def setup_cron():
 
 def setup_env_file():
     """Создает файл .env для хранения переменных окружения."""
-    env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+    env_path = _SCRIPT_DIR / ".env"
     
     if os.path.exists(env_path):
         print(f"Файл .env уже существует: {env_path}")
@@ -215,6 +348,8 @@ def main():
         setup_env_file()
         return
     
+    configure_logging()
+    
     # Определяем режим запуска (день/ночь)
     is_nighttime = args.nighttime
     
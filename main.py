@@ -137,14 +137,13 @@ async def process_results(listings):
             from app.telegram_sender import TelegramSender
             
             # Создаем экземпляр отправителя
-            sender = TelegramSender(
+            async with TelegramSender(
                 bot_token=telegram_bot_token,
                 chat_id=telegram_chat_id
-            )
-            
-            # Отправляем объявления
-            logger.info(f"Отправка {len(new_listings)} новых объявлений в Telegram...")
-            sent_count, skipped_count = await sender.send_listings(new_listings, delay=3.0)
+            ) as sender:
+                # Отправляем объявления
+                logger.info(f"Отправка {len(new_listings)} новых объявлений в Telegram...")
+                sent_count, skipped_count = await sender.send_listings(new_listings, delay=3.0)
             
             logger.info(f"Отправлено {sent_count} объявлений в Telegram, пропущено {skipped_count}")
         except Exception as e:
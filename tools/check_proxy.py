@@ -8,33 +8,62 @@ import sys
 import requests
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Добавляем корневую директорию проекта в sys.path
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.append(str(PROJECT_ROOT))
 
-from dotenv import load_dotenv
+from dotenv import dotenv_values
 
-# Загружаем .env
+# Читаем .env один раз в словарь, не изменяя os.environ
 dotenv_path = PROJECT_ROOT / 'config' / '.env'
-if dotenv_path.exists():
-    load_dotenv(dotenv_path=dotenv_path)
+ENV = dotenv_values(dotenv_path) if dotenv_path.exists() else {}
 
-def get_ip_info(proxy=None):
+def get_env(name, default=''):
+    """Возвращает переменную окружения, а при ее отсутствии - значение из .env."""
+    value = os.getenv(name)
+    if value is None:
+        value = ENV.get(name)
+    return value if value is not None else default
+
+# Сайты для проверки доступности
+SITES = [
+    'https://www.mercadolibre.com.uy',
+    'https://www.infocasas.com.uy',
+    'https://www.gallito.com.uy'
+]
+
+def create_session(proxy=None, pool_size=len(SITES) + 1):
+    """Создает сессию с пулом соединений на все одновременные проверки."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=1, backoff_factor=0.2)
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    
+    if proxy:
+        print(f"Использование прокси: {proxy}")
+        session.proxies = {
+            'http': proxy,
+            'https': proxy
+        }
+    else:
+        print("Без использования прокси")
+    
+    return session
+
+def get_ip_info(session):
     """Получает информацию об IP-адресе."""
     try:
-        if proxy:
-            print(f"Использование прокси: {proxy}")
-            proxies = {
-                'http': proxy,
-                'https': proxy
-            }
-            response = requests.get('https://ipinfo.io/json', proxies=proxies, timeout=10)
-        else:
-            print("Без использования прокси")
-            response = requests.get('https://ipinfo.io/json', timeout=10)
+        response = session.get('https://ipinfo.io/json', timeout=10)
         
         if response.status_code == 200:
             return response.json()
@@ -45,23 +74,20 @@ def get_ip_info(proxy=None):
         print(f"Ошибка при запросе IP информации: {e}")
         return None
 
-def check_site_access(url, proxy=None):
-    """Проверяет доступность сайта."""
+def check_site_access(url, session):
+    """Проверяет доступность сайта. Тело страницы не загружается."""
     try:
-        if proxy:
-            proxies = {
-                'http': proxy,
-                'https': proxy
-            }
-            response = requests.get(url, proxies=proxies, timeout=10)
-        else:
-            response = requests.get(url, timeout=10)
+        response = session.head(url, timeout=10, allow_redirects=True)
+        if response.status_code in (403, 405, 501):
+            # Сайт не поддерживает HEAD - читаем только статус и заголовки GET-ответа
+            response = session.get(url, timeout=10, stream=True)
+            response.close()
         
         return {
             'url': url,
             'status_code': response.status_code,
             'accessible': response.status_code == 200,
-            'content_length': len(response.content)
+            'content_length': response.headers.get('content-length')
         }
     except Exception as e:
         return {
@@ -83,10 +109,10 @@ def main():
     # Получаем прокси из аргументов или .env
     proxy = None
     if args.env:
-        if os.getenv('USE_PROXY') == 'true':
-            server = os.getenv('SMARTPROXY_SERVER', '')
-            user = os.getenv('SMARTPROXY_USER', '')
-            password = os.getenv('SMARTPROXY_PASSWORD', '')
+        if get_env('USE_PROXY') == 'true':
+            server = get_env('SMARTPROXY_SERVER')
+            user = get_env('SMARTPROXY_USER')
+            password = get_env('SMARTPROXY_PASSWORD')
             
             if server and user and password:
                 proxy = f"http://{user}:{password}@{server}"
@@ -98,9 +124,14 @@ def main():
     elif args.proxy:
         proxy = args.proxy
     
-    # Проверяем текущий IP
+    # Запросы IP-информации и проверки сайтов выполняются параллельно,
+    # результаты выводятся в прежнем порядке
     print("=== Информация о текущем IP ===")
-    ip_info = get_ip_info(proxy)
+    with create_session(proxy) as session, ThreadPoolExecutor(max_workers=len(SITES) + 1) as executor:
+        ip_future = executor.submit(get_ip_info, session)
+        site_results = list(executor.map(lambda site: check_site_access(site, session), SITES))
+        ip_info = ip_future.result()
+    
     if ip_info:
         print(f"IP: {ip_info.get('ip')}")
         print(f"Страна: {ip_info.get('country')}")
@@ -113,19 +144,13 @@ def main():
     
     # Проверяем доступность уругвайских сайтов
     print("\n=== Проверка доступности сайтов ===")
-    sites = [
-        'https://www.mercadolibre.com.uy',
-        'https://www.infocasas.com.uy',
-        'https://www.gallito.com.uy'
-    ]
-    
-    for site in sites:
-        result = check_site_access(site, proxy)
+    for site, result in zip(SITES, site_results):
         status = "✅ Доступен" if result.get('accessible') else "❌ Недоступен"
         print(f"{site}: {status}")
         if args.verbose:
             print(f"  Статус код: {result.get('status_code')}")
-            print(f"  Размер контента: {result.get('content_length')} байт")
+            if result.get('content_length') is not None:
+                print(f"  Размер контента: {result.get('content_length')} байт")
             if 'error' in result:
                 print(f"  Ошибка: {result.get('error')}")
     
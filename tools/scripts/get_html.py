@@ -1,24 +1,60 @@
 import asyncio
+import aiohttp
 from playwright.async_api import async_playwright
 
+# Resource types that are not needed to get the HTML
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+
+# Marker of a server-rendered MercadoLibre listing page
+SSR_MARKER = 'ui-pdp'
+
 URL = 'https://terreno.mercadolibre.com.uy/MLU-690599348-lotes-en-design-village-barrio-privado-en-solanas-financiacion-del-100-a-sola-firma-_JM'
 
-async def main():
+async def fetch_without_browser(url):
+    """Fetches the page over plain HTTP; returns None if it is not server-rendered."""
+    timeout = aiohttp.ClientTimeout(total=30)
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                content = await response.text()
+    except Exception as e:
+        print(f"HTTP fetch failed: {e}")
+        return None
+    return content if SSR_MARKER in content else None
+
+async def fetch_with_browser(url):
     async with async_playwright() as p:
-        browser = await p.firefox.launch(headless=True)
+        browser = await p.chromium.launch(
+            headless=True,
+            args=["--disable-dev-shm-usage", "--no-sandbox", "--disable-gpu"]
+        )
         page = await browser.new_page()
+        # Only the DOM is needed: skip images, fonts and stylesheets
+        await page.route("**/*", lambda route: route.abort()
+                         if route.request.resource_type in BLOCKED_RESOURCE_TYPES
+                         else route.continue_())
         try:
-            print(f"Navigating to {URL}...")
-            await page.goto(URL, wait_until='load', timeout=60000) # Wait for full load
+            print(f"Navigating to {url}...")
+            await page.goto(url, wait_until='load', timeout=60000) # Wait for full load
             print("Page loaded. Getting content...")
-            content = await page.content()
-            print("\n--- HTML CONTENT START ---\n")
-            print(content)
-            print("\n--- HTML CONTENT END ---\n")
-        except Exception as e:
-            print(f"An error occurred: {e}")
+            return await page.content()
         finally:
             await browser.close()
 
+async def main():
+    try:
+        print(f"Fetching {URL} over HTTP...")
+        content = await fetch_without_browser(URL)
+        if content is None:
+            print("Page is not server-rendered, falling back to the browser")
+            content = await fetch_with_browser(URL)
+        print("\n--- HTML CONTENT START ---\n")
+        print(content)
+        print("\n--- HTML CONTENT END ---\n")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
 if __name__ == '__main__':
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())